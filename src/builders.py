@@ -0,0 +1,108 @@
+import functools
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from typing import Any, NoReturn
+
+import pandas as pd
+
+from src.data import DATE_FORMAT, Date, Order
+
+
+def _split_date(date_str: str, year_width: int) -> tuple[int, int, int] | None:
+    parts = date_str.split(".")
+    if len(parts) != 3:
+        return None
+    day, month, year = parts
+    if not (1 <= len(day) <= 2 and 1 <= len(month) <= 2 and len(year) == year_width):
+        return None
+    if not (date_str.isascii() and day.isdigit() and month.isdigit() and year.isdigit()):
+        return None
+    return int(day), int(month), int(year)
+
+
+def _parse_ddmmyy(date_str: str) -> date | None:
+    if (parts := _split_date(date_str, 2)) is None:
+        return None
+    day, month, year = parts
+    year += 2000 if year < 69 else 1900
+    return date(year, month, day)
+
+
+def _parse_ddmmyyyy(date_str: str) -> date | None:
+    if (parts := _split_date(date_str, 4)) is None:
+        return None
+    day, month, year = parts
+    return date(year, month, day)
+
+
+_DATE_PARSERS = {"%d.%m.%y": _parse_ddmmyy, "%d.%m.%Y": _parse_ddmmyyyy}
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date(date_str: str, date_format: str) -> Date:
+    parser = _DATE_PARSERS.get(date_format)
+    # Anything the fast path does not recognise gets strptime's exact rules and errors
+    if parser is None or (parsed := parser(date_str)) is None:
+        return Date.to_date(datetime.strptime(date_str, date_format).date())
+    return Date.to_date(parsed)
+
+
+def _raise_bad_date(field_name: str, field_value: Any) -> NoReturn:
+    error_msg = f"Unknown type for a field {field_name} - {type(field_value)} {field_value}"
+    logging.error(error_msg)
+    raise ValueError(error_msg)
+
+
+def convert_date(field_value: Date | str | date, field_name: str, date_format: str) -> Date:
+    field_type = type(field_value)
+    if field_type is Date:
+        return field_value
+    elif field_type is str:
+        return _parse_date(field_value, date_format)
+    elif isinstance(field_value, date):
+        return Date.to_date(field_value)
+    else:
+        _raise_bad_date(field_name, field_value)
+
+
+def build_order(order_cls: type[Order], raw: dict[str, Any]) -> Order:
+    fields = dict(raw)
+    for field_name in order_cls.date_fields:
+        field_value = fields[field_name]
+        if type(field_value) is not Date:
+            fields[field_name] = convert_date(field_value, field_name, DATE_FORMAT)
+    return order_cls(**fields)
+
+
+def build_orders(order_cls: type[Order], rows: list[dict[str, Any]]) -> list[Order]:
+    parsed_columns = {}
+    for field_name in order_cls.date_fields:
+        column = [row[field_name] for row in rows]
+        # Only strings go through the vectorized parse, Date/date/None take the per-row path
+        str_indices = [i for i, value in enumerate(column) if type(value) is str]
+        if str_indices:
+            parsed = pd.to_datetime([column[i] for i in str_indices], format=DATE_FORMAT, cache=True)
+            for i, dt in zip(str_indices, parsed):
+                if dt is pd.NaT:
+                    _raise_bad_date(field_name, column[i])
+                column[i] = Date.to_date(dt.date())
+        parsed_columns[field_name] = [convert_date(value, field_name, DATE_FORMAT) for value in column]
+
+    return [order_cls(**{**row, **{name: col[i] for name, col in parsed_columns.items()}}) for i, row in enumerate(rows)]
+
+
+def build_orders_parallel(
+    order_cls: type[Order],
+    rows: list[dict[str, Any]],
+    chunk_size: int = 2000,
+    max_workers: int | None = None,
+) -> list[Order]:
+    if len(rows) <= chunk_size:
+        return build_orders(order_cls, rows)
+
+    chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(build_orders, itertools.repeat(order_cls), chunks)
+        return list(itertools.chain.from_iterable(results))
@@ -1,35 +1,36 @@
 import dataclasses
+import functools
 import logging
 import os
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from enum import Enum, unique
 from pathlib import Path
 from typing import Iterator, NamedTuple, Union
 
-env = os.getenv("ENV", "prod")
 
-if env == "prod":
+@unique
+class JobType(Enum):
+    BUSINESS_TRIP = 0
+    VACATION = 1
+    VACATION_WITHDRAW = 2
+    FIRING = 3
+    MENTORSHIP = 4
+    VND = 5
+    TRIP_ADD_PAY = 6
+    VACATION_ADD_PAY = 7
 
-    @unique
-    class JobType(Enum):
-        BUSINESS_TRIP = 0
-        VACATION = 1
-        VACATION_WITHDRAW = 2
-        FIRING = 3
-        MENTORSHIP = 4
-        VND = 5
-        TRIP_ADD_PAY = 6
-        VACATION_ADD_PAY = 7
+    def __str__(self) -> str:
+        return f"JobType(name={self.name}, value={self.value})"
 
-        def __str__(self) -> str:
-            return f"JobType(name={self.name}, value={self.value})"
+    def __repr__(self) -> str:
+        return str(self)
 
-        def __repr__(self) -> str:
-            return str(self)
 
-else:
-    logging.error("Test environment for BPM is not set")
-    raise NotImplementedError("Test environment for BPM is not set")
+def check_env() -> None:
+    env = os.getenv("ENV", "prod")
+    if env != "prod":
+        logging.error("Test environment for BPM is not set")
+        raise NotImplementedError("Test environment for BPM is not set")
 
 
 Order = Union[
@@ -44,14 +45,54 @@ Order = Union[
 ]
 
 
-class Date(NamedTuple):
-    dt: datetime
-    long: str
-    short: str
+@functools.total_ordering
+class Date:
+    __slots__ = ("dt", "_long", "_short")
+
+    def __init__(
+        self, dt: date, long: str | None = None, short: str | None = None
+    ) -> None:
+        self.dt = dt
+        self._long = long
+        self._short = short
 
     @classmethod
-    def to_date(cls, dt: datetime) -> "Date":
-        return Date(dt, dt.strftime("%d.%m.%Y"), dt.strftime("%d.%m.%y"))
+    def to_date(cls, dt: date | datetime) -> "Date":
+        if isinstance(dt, datetime):
+            dt = dt.date()
+        pooled = _DATE_POOL.get(dt)
+        if pooled is None:
+            pooled = _DATE_POOL[dt] = Date(dt)
+        return pooled
+
+    @property
+    def long(self) -> str:
+        long = self._long
+        if long is None:
+            dt = self.dt
+            long = self._long = f"{dt.day:02d}.{dt.month:02d}.{dt.year:04d}"
+        return long
+
+    @property
+    def short(self) -> str:
+        short = self._short
+        if short is None:
+            dt = self.dt
+            short = self._short = f"{dt.day:02d}.{dt.month:02d}.{dt.year % 100:02d}"
+        return short
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not Date:
+            return NotImplemented
+        return self.dt == other.dt
+
+    def __lt__(self, other: object) -> bool:
+        if type(other) is not Date:
+            return NotImplemented
+        return self.dt < other.dt
+
+    def __hash__(self) -> int:
+        return hash(self.dt)
 
     def __str__(self) -> str:
         return f"Date<{self.short}>"
@@ -60,29 +101,45 @@ class Date(NamedTuple):
         return str(self)
 
 
+_DATE_POOL: dict[date, Date] = {}
+
+
 class TimeRange(NamedTuple):
     start: Date
     end: Date
 
 
+def prewarm_dates(t_range: TimeRange) -> None:
+    current = t_range.start.dt
+    while current <= t_range.end.dt:
+        Date.to_date(current)
+        current += timedelta(days=1)
+
+
 class Mail(NamedTuple):
     server: str
     sender: str
     recipients: str
     subject: str
     report_path: Path
-    screenshot_folder: Path
+    screenshot_folder: str
+
+    def screenshot_folder_path(self) -> Path:
+        return Path(self.screenshot_folder)
 
 
 class PathRegistry(NamedTuple):
     data_folder: Path
     report_folder: Path
-    screenshot_folder: Path
+    screenshot_folder: str
     csv_path: Path
     pickle_path: Path
     report_path: Path
     log_path: Path
 
+    def screenshot_folder_path(self) -> Path:
+        return Path(self.screenshot_folder)
+
 
 class Job(NamedTuple):
     job_type: JobType
@@ -107,9 +164,18 @@ class Jobs:
     vacation_add_pay: Job
 
     def __iter__(self) -> Iterator[Job]:
-        # noinspection PyTypeChecker
-        for field in dataclasses.fields(self):
-            yield getattr(self, field.name)
+        return iter(
+            (
+                self.business_trip,
+                self.vacation,
+                self.vacation_withdraw,
+                self.firing,
+                self.mentorship,
+                self.vnd,
+                self.trip_add_pay,
+                self.vacation_add_pay,
+            )
+        )
 
 
 class ParseParams(NamedTuple):
@@ -119,197 +185,163 @@ class ParseParams(NamedTuple):
     statuses_to_skip: set[str]
 
 
-def convert_date(obj: object, field_name: str, date_format: str) -> None:
-    field_value = getattr(obj, field_name)
-    if isinstance(field_value, Date):
-        return
-    elif isinstance(field_value, datetime):
-        setattr(obj, field_name, Date.to_date(field_value))
-    elif isinstance(field_value, str):
-        date = datetime.strptime(field_value, date_format)
-        setattr(obj, field_name, Date.to_date(date))
-    else:
-        error_msg = (
-            f"Unknown type for a field {field_name} - {type(field_value)} {field_value}"
-        )
-        logging.error(error_msg)
-        raise ValueError(error_msg)
-
-
-@dataclasses.dataclass(slots=True)
-class BusinessTripOrder:
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_number: str
-    start_date: Date | str | datetime
-    end_date: Date | str | datetime
-    trip_place: str
-    trip_code: str
-    trip_reason: str
-    main_order_start_date: Date | str | datetime
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
-
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "start_date", "%d.%m.%y")
-        convert_date(self, "end_date", "%d.%m.%y")
-        convert_date(self, "main_order_start_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class VacationOrder:
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_type: str
-    start_date: Date | str | datetime
-    end_date: Date | str | datetime
-    order_number: str
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
-
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "start_date", "%d.%m.%y")
-        convert_date(self, "end_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class VacationWithdrawOrder:
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_number: str
-    withdraw_date: Date | str | datetime
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
+DATE_FORMAT = "%d.%m.%y"
+
+_DATE_FIELDS: dict[JobType, tuple[str, ...]] = {
+    JobType.BUSINESS_TRIP: ("start_date", "end_date", "main_order_start_date"),
+    JobType.VACATION: ("start_date", "end_date"),
+    JobType.VACATION_WITHDRAW: ("withdraw_date",),
+    JobType.FIRING: ("firing_date",),
+    JobType.MENTORSHIP: ("start_date", "end_date"),
+    JobType.VND: ("start_date", "end_date"),
+    JobType.TRIP_ADD_PAY: ("start_date", "end_date"),
+    JobType.VACATION_ADD_PAY: ("start_date", "end_date"),
+}
+
+_COMMON_FIELDS = [
+    ("was_done_previously", bool),
+    ("screenshot_path", str),
+    ("employee_status", str | None, dataclasses.field(default=None)),
+    ("branch_num", str | None, dataclasses.field(default=None)),
+    ("tab_num", str | None, dataclasses.field(default=None)),
+]
 
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "withdraw_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class FiringOrder:
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_number: str
-    compensation: str
-    firing_date: Date | str | datetime
-    main_article: str
-    extra_article: str
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
 
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "firing_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class MentorshipOrder:
-    mentee_fullname: str
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    start_date: Date | str | datetime
-    end_date: Date | str | datetime
-    order_number: str
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
+def _order_str(self) -> str:
+    return f"{self.employee_fullname} {self.order_number}"
 
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "start_date", "%d.%m.%y")
-        convert_date(self, "end_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class VNDOrder:
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_number: str
-    doplata: str | None
-    start_date: Date
-    end_date: Date
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
 
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "start_date", "%d.%m.%y")
-        convert_date(self, "end_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class TripAddPayOrder:
-    substitutee_fullname: str
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_number: str
-    doplata: str
-    start_date: Date
-    end_date: Date
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
+def make_order_cls(
+    cls_name: str, job_type: JobType, fields: list[tuple[str, type]]
+) -> type:
+    return dataclasses.make_dataclass(
+        cls_name,
+        [*fields, *_COMMON_FIELDS],
+        namespace={
+            "__module__": __name__,
+            "__str__": _order_str,
+            "date_fields": _DATE_FIELDS[job_type],
+        },
+        slots=True,
+        frozen=True,
+    )
 
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "start_date", "%d.%m.%y")
-        convert_date(self, "end_date", "%d.%m.%y")
-
-
-@dataclasses.dataclass(slots=True)
-class VacationAddPayOrder:
-    substitutee_fullname: str
-    employee_fullname: str
-    employee_names: tuple[str, str]
-    order_number: str
-    doplata: str
-    start_date: Date
-    end_date: Date
-    was_done_previously: bool
-    screenshot_path: str
-    employee_status: str | None = None
-    branch_num: str | None = None
-    tab_num: str | None = None
 
-    def __str__(self) -> str:
-        return f"{self.employee_fullname} {self.order_number}"
-
-    def __post_init__(self):
-        convert_date(self, "start_date", "%d.%m.%y")
-        convert_date(self, "end_date", "%d.%m.%y")
+BusinessTripOrder = make_order_cls(
+    "BusinessTripOrder",
+    JobType.BUSINESS_TRIP,
+    [
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_number", str),
+        ("start_date", Date),
+        ("end_date", Date),
+        ("trip_place", str),
+        ("trip_code", str),
+        ("trip_reason", str),
+        ("main_order_start_date", Date),
+    ],
+)
+
+VacationOrder = make_order_cls(
+    "VacationOrder",
+    JobType.VACATION,
+    [
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_type", str),
+        ("start_date", Date),
+        ("end_date", Date),
+        ("order_number", str),
+    ],
+)
+
+VacationWithdrawOrder = make_order_cls(
+    "VacationWithdrawOrder",
+    JobType.VACATION_WITHDRAW,
+    [
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_number", str),
+        ("withdraw_date", Date),
+    ],
+)
+
+FiringOrder = make_order_cls(
+    "FiringOrder",
+    JobType.FIRING,
+    [
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_number", str),
+        ("compensation", str),
+        ("firing_date", Date),
+        ("main_article", str),
+        ("extra_article", str),
+    ],
+)
+
+MentorshipOrder = make_order_cls(
+    "MentorshipOrder",
+    JobType.MENTORSHIP,
+    [
+        ("mentee_fullname", str),
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("start_date", Date),
+        ("end_date", Date),
+        ("order_number", str),
+    ],
+)
+
+VNDOrder = make_order_cls(
+    "VNDOrder",
+    JobType.VND,
+    [
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_number", str),
+        ("doplata", str | None),
+        ("start_date", Date),
+        ("end_date", Date),
+    ],
+)
+
+TripAddPayOrder = make_order_cls(
+    "TripAddPayOrder",
+    JobType.TRIP_ADD_PAY,
+    [
+        ("substitutee_fullname", str),
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_number", str),
+        ("doplata", str),
+        ("start_date", Date),
+        ("end_date", Date),
+    ],
+)
+
+VacationAddPayOrder = make_order_cls(
+    "VacationAddPayOrder",
+    JobType.VACATION_ADD_PAY,
+    [
+        ("substitutee_fullname", str),
+        ("employee_fullname", str),
+        ("employee_names", tuple[str, str]),
+        ("order_number", str),
+        ("doplata", str),
+        ("start_date", Date),
+        ("end_date", Date),
+    ],
+)
+
+ORDER_CLASSES: tuple[type, ...] = (
+    BusinessTripOrder,
+    VacationOrder,
+    VacationWithdrawOrder,
+    FiringOrder,
+    MentorshipOrder,
+    VNDOrder,
+    TripAddPayOrder,
+    VacationAddPayOrder,
+)
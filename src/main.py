@@ -1,4 +1,5 @@
 import dataclasses
+import functools
 import logging
 import os
 import re
@@ -6,15 +7,17 @@ import sys
 import warnings
 from contextlib import suppress
 from datetime import datetime
-from difflib import SequenceMatcher
 from pathlib import Path
 from time import sleep
 from typing import Optional, Generator, cast
 
 import dotenv
+from _ctypes import COMError
 import pyperclip
 from pywinauto import ElementNotFoundError
 from pywinauto.keyboard import send_keys
+from pywinauto.uia_defines import NoPatternInterfaceError
+from rapidfuzz import fuzz, process
 from urllib3.exceptions import InsecureRequestWarning
 
 from src.utils.automation import (
@@ -31,9 +34,12 @@ from src.utils.automation import (
     check,
     UiaPane,
     UiaList,
-    children,
     UiaListItem,
-    iter_children,
+    UiaTable,
+    UiaCustom,
+    UiaDocument,
+    edits,
+    tab_join,
 )
 
 project_folder = Path(__file__).resolve().parent.parent
@@ -41,24 +47,29 @@ os.environ["project_folder"] = str(project_folder)
 os.chdir(project_folder)
 sys.path.append(str(project_folder))
 
+from src.data import check_env
 from src.utils.app import App
 from src.utils.db_manager import DatabaseManager
 
 from src.utils import logger
 
+ONE_C_BASE_PATH = r"C:\Users\robot3\Desktop\damu_1c\test_base.v8i"
 
-def prepare_query(contragent: str) -> str:
-    query = f"""
+_QUERY_TEMPLATE = re.sub(
+    r" {2,}",
+    "",
+    """
         ВЫБРАТЬ Проекты.Ссылка
         ИЗ Справочник.Контрагенты КАК Агенты
         ВНУТРЕННЕЕ СОЕДИНЕНИЕ Справочник.Проектыконтрагентов КАК Проекты
         ПО Агенты.Ссылка = Проекты.Владелец
         ГДЕ Агенты.БИНИИН = "{contragent}"
-    """
+    """,
+).strip()
 
-    query = re.sub(r" {2,}", "", query).strip()
 
-    return query
+def prepare_query(contragent: str) -> str:
+    return _QUERY_TEMPLATE.replace("{contragent}", contragent)
 
 
 def iso_to_standard(dt: str) -> str:
@@ -67,6 +78,19 @@ def iso_to_standard(dt: str) -> str:
     return datetime.fromisoformat(dt).strftime("%d.%m.%Y")
 
 
+def to_compact_date(dt: str) -> str:
+    if len(dt) >= 10 and dt[4] == "-" and dt[7] == "-":
+        return dt[8:10] + dt[5:7] + dt[0:4]
+    if dt[2] == "." and dt[5] == ".":
+        return dt.replace(".", "")
+    return iso_to_standard(dt).replace(".", "")
+
+
+@functools.lru_cache(maxsize=1)
+def downloads_root() -> Path:
+    return project_folder / "downloads" / os.environ["today"]
+
+
 @dataclasses.dataclass(slots=True)
 class Contract:
     contract_id: str
@@ -90,26 +114,36 @@ class Contract:
     end_date: str
     protocol_id: str
     sed_number: str
-    document_path: Optional[Path] = None
-    protocol_pdf_path: Optional[Path] = None
+    file_name: Optional[str] = None
+    _protocol_pdf_path: Optional[Path] = dataclasses.field(default=None, init=False, repr=False)
 
     def __post_init__(self) -> None:
-        self.protocol_date = iso_to_standard(self.protocol_date).replace(".", "")
-        self.vypiska_date = iso_to_standard(self.vypiska_date).replace(".", "")
-        self.ds_date = iso_to_standard(self.ds_date).replace(".", "")
-        self.dbz_date = iso_to_standard(self.dbz_date).replace(".", "")
-        self.start_date = iso_to_standard(self.start_date).replace(".", "")
-        self.end_date = iso_to_standard(self.end_date).replace(".", "")
-
-        today = str(os.environ["today"])
-        contract_folder = ("downloads" / Path(today) / self.contract_id).absolute()
-        with suppress(FileNotFoundError):
-            self.protocol_pdf_path = next((contract_folder / "vypiska").iterdir(), None)
-        self.document_path = contract_folder / "documents" / Path(self.document_path)
+        self.protocol_date = to_compact_date(self.protocol_date)
+        self.vypiska_date = to_compact_date(self.vypiska_date)
+        self.ds_date = to_compact_date(self.ds_date)
+        self.dbz_date = to_compact_date(self.dbz_date)
+        self.start_date = to_compact_date(self.start_date)
+        self.end_date = to_compact_date(self.end_date)
+
+    @property
+    def contract_folder(self) -> Path:
+        return downloads_root() / self.contract_id
+
+    @property
+    def document_path(self) -> Path:
+        return self.contract_folder / "documents" / self.file_name
+
+    @property
+    def protocol_pdf_path(self) -> Optional[Path]:
+        if self._protocol_pdf_path is None:
+            with suppress(FileNotFoundError):
+                self._protocol_pdf_path = next((self.contract_folder / "vypiska").iterdir(), None)
+        return self._protocol_pdf_path
 
     @classmethod
     def iter_contracts(cls, db: DatabaseManager) -> Generator["Contract", None, None]:
-        raw_contracts = db.execute("""
+        yield from db.iter_execute(
+            """
             SELECT
                 id AS contract_id,
                 contragent,
@@ -139,11 +173,70 @@ class Contract:
                 AND id NOT IN (
                     SELECT id FROM errors WHERE traceback IS NOT NULL
                 )
-        """)
+            """,
+            row_factory=lambda _, row: cls(*row),
+        )
+
+    @classmethod
+    def iter_contracts_with_rates(cls, db: DatabaseManager) -> Generator[tuple["Contract", Optional["InterestRate"]], None, None]:
+        def row_factory(_: object, row: tuple) -> tuple["Contract", Optional["InterestRate"]]:
+            raw_contract, raw_rate = row[:22], row[22:]
+            return cls(*raw_contract), InterestRate(*raw_rate) if raw_rate[0] is not None else None
 
-        for raw_contract in raw_contracts:
-            contract = Contract(*raw_contract)
-            yield contract
+        yield from db.iter_execute(
+            """
+            SELECT
+                c.id AS contract_id,
+                c.contragent,
+                c.project,
+                c.credit_purpose,
+                c.repayment_procedure,
+                c.loan_amount,
+                c.subsid_amount,
+                c.investment_amount,
+                c.pos_amount,
+                c.protocol_date,
+                c.vypiska_date,
+                c.decision_date,
+                c.iban,
+                c.ds_id,
+                c.ds_date,
+                c.dbz_id,
+                c.dbz_date,
+                c.start_date,
+                c.end_date,
+                c.protocol_id,
+                c.sed_number,
+                c.file_name,
+                r.id,
+                r.subsid_term,
+                r.nominal_rate * 100.0 AS nominal_rate,
+                r.rate_one_two_three_year * 100.0 AS rate_one_two_three_year,
+                r.rate_four_year * 100.0 AS rate_four_year,
+                r.rate_five_year * 100.0 AS rate_five_year,
+                r.rate_six_seven_year * 100.0 AS rate_six_seven_year,
+                r.rate_fee_one_two_three_year * 100.0 AS rate_fee_one_two_three_year,
+                r.rate_fee_four_year * 100.0 AS rate_fee_four_year,
+                r.rate_fee_five_year * 100.0 AS rate_fee_five_year,
+                r.rate_fee_six_seven_year * 100.0 AS rate_fee_six_seven_year,
+                r.start_date_one_two_three_year,
+                r.end_date_one_two_three_year,
+                r.start_date_four_year,
+                r.end_date_four_year,
+                r.start_date_five_year,
+                r.end_date_five_year,
+                r.start_date_six_seven_year,
+                r.end_date_six_seven_year
+            FROM contracts AS c
+            LEFT JOIN interest_rates AS r ON c.id = r.id
+            WHERE
+                c.dbz_id IS NOT NULL
+                AND c.id NOT IN (
+                    SELECT id FROM errors WHERE traceback IS NOT NULL
+                )
+            """,
+            row_factory=row_factory,
+        )
 
 
 @dataclasses.dataclass(slots=True)
@@ -168,17 +261,6 @@ class InterestRate:
     start_date_six_seven_year: str
     end_date_six_seven_year: str
 
-    def __post_init__(self) -> None:
-        self.nominal_rate *= 100
-        self.rate_one_two_three_year *= 100
-        self.rate_four_year *= 100
-        self.rate_five_year *= 100
-        self.rate_six_seven_year *= 100
-        self.rate_fee_one_two_three_year *= 100
-        self.rate_fee_four_year *= 100
-        self.rate_fee_five_year *= 100
-        self.rate_fee_six_seven_year *= 100
-
     @classmethod
     def load(cls, db: DatabaseManager, contract_id: str) -> "InterestRate":
         raw_rate = db.execute(
@@ -186,15 +268,15 @@ class InterestRate:
                 SELECT
                     id,
                     subsid_term,
-                    nominal_rate,
-                    rate_one_two_three_year,
-                    rate_four_year,
-                    rate_five_year,
-                    rate_six_seven_year,
-                    rate_fee_one_two_three_year,
-                    rate_fee_four_year,
-                    rate_fee_five_year,
-                    rate_fee_six_seven_year,
+                    nominal_rate * 100.0 AS nominal_rate,
+                    rate_one_two_three_year * 100.0 AS rate_one_two_three_year,
+                    rate_four_year * 100.0 AS rate_four_year,
+                    rate_five_year * 100.0 AS rate_five_year,
+                    rate_six_seven_year * 100.0 AS rate_six_seven_year,
+                    rate_fee_one_two_three_year * 100.0 AS rate_fee_one_two_three_year,
+                    rate_fee_four_year * 100.0 AS rate_fee_four_year,
+                    rate_fee_five_year * 100.0 AS rate_fee_five_year,
+                    rate_fee_six_seven_year * 100.0 AS rate_fee_six_seven_year,
                     start_date_one_two_three_year,
                     end_date_one_two_three_year,
                     start_date_four_year,
@@ -212,17 +294,51 @@ class InterestRate:
         return InterestRate(*raw_rate[0])
 
 
+MIN_CONTAINED_PROJECT_LENGTH = 8
+
+
 def find_row(parent: UiaList, project: str) -> Optional[UiaListItem]:
-    rows = children(parent)
-    for row in rows:
+    project_norm = project.strip().casefold()
+
+    rows: list[UiaListItem] = []
+    texts: list[str] = []
+    containing_row: Optional[UiaListItem] = None
+    for row in parent.iter_children():
         txt = cast(str, row.window_text()).strip()
-        if not txt:
-            continue
-        score = SequenceMatcher(None, project, txt).ratio()
-        if score >= 0.8:
-            print(f"{len(rows)=}, {txt=}, {score=}")
+        txt_norm = txt.casefold()
+        if txt_norm and txt_norm == project_norm:
             return row
-    return None
+        # Only a row that contains the whole project name counts, a short row that is part of the name does not
+        if containing_row is None and len(project_norm) >= MIN_CONTAINED_PROJECT_LENGTH and project_norm in txt_norm:
+            containing_row = row
+        rows.append(row)
+        texts.append(txt)
+
+    if containing_row is not None:
+        return containing_row
+
+    if not texts:
+        return None
+
+    scores = process.cdist([project], texts, scorer=fuzz.ratio, score_cutoff=80)[0]
+    idx = int(scores.argmax())
+    score = scores[idx]
+    if score < 80:
+        return None
+
+    print(f"{len(rows)=}, txt={texts[idx]!r}, {score=}")
+    return rows[idx]
+
+
+def set_query_text(query_box: UiaDocument, query: str) -> bool:
+    # A read-only or disabled ValuePattern raises COMError, and SetValue can also be silently ignored
+    try:
+        query_box.iface_value.SetValue(query)
+        current = cast(str, query_box.iface_value.CurrentValue)
+    except (NoPatternInterfaceError, COMError) as err:
+        logging.warning(f"Could not set the query through ValuePattern: {err!r}")
+        return False
+    return current.replace("\r\n", "\n").strip() == query.replace("\r\n", "\n").strip()
 
 
 def find_project(top_win: UiaWindow, contract: Contract) -> None:
@@ -234,10 +350,11 @@ def find_project(top_win: UiaWindow, contract: Contract) -> None:
     delete_button = child_win(top_win, title="Delete", ctrl="Button", idx=1)
 
     query = prepare_query(contract.contragent)
-    pyperclip.copy(query)
 
     a(top_win, lambda: query_document_box_obj.click_input())
-    a(top_win, lambda: send_keys("^a^v"))
+    if not set_query_text(query_document_box_obj, query):
+        pyperclip.copy(query)
+        a(top_win, lambda: send_keys("^a^v"))
     a(top_win, lambda: child_win(top_win, title="Выполнить", ctrl="Button").click_input())
 
     if not wait_for(lambda: delete_button.is_enabled() == True, timeout=10):
@@ -268,12 +385,14 @@ def fill_main_project_data(win: UiaWindow, form: UiaPane, contract: Contract) ->
     Заполнение данных в форме проекта во вкладке "Основные"
     (Цель кредитования, Номер протокола, Дата протокола, Дата получения протокола РКС филиалом)
     """
-    a(win, lambda: child_win(parent=form, ctrl="Edit", idx=7).click_input())
+    fields = edits(form)
+
+    a(win, lambda: fields[7].click_input())
     a(win, lambda: send_keys("{F4}^f" + contract.credit_purpose + "{ENTER 2}", pause=0.1))
 
-    a(win, lambda: click_type_keys(child_win(form, ctrl="Edit", idx=1), contract.protocol_id))
-    a(win, lambda: click_type_keys(child_win(form, ctrl="Edit", idx=2), contract.protocol_date))
-    a(win, lambda: click_type_keys(child_win(form, ctrl="Edit", idx=3), contract.protocol_date))
+    a(win, lambda: click_type_keys(fields[1], contract.protocol_id))
+    a(win, lambda: click_type_keys(fields[2], contract.protocol_date))
+    a(win, lambda: click_type_keys(fields[3], contract.protocol_date))
 
 
 def change_date(win: UiaWindow, form: UiaPane, goto_button: UiaButton, protocol_date: str) -> None:
@@ -297,6 +416,19 @@ def change_date(win: UiaWindow, form: UiaPane, goto_button: UiaButton, protocol_
         a(win, lambda: send_keys("{ENTER 4}{ESC}", pause=0.5))
 
 
+CREDIT_PURPOSES = frozenset({"Пополнение оборотных средств", "Инвестиционный", "Инвестиционный + ПОС"})
+# Amount fields in the "БВУ/Рефинансирование" record and how many {TAB}s reach each from the record's first field
+POS_AMOUNT_FIELD = "На ПОС"
+INVESTMENT_AMOUNT_FIELD = "На инвестиции"
+AMOUNT_FIELD_TABS = {POS_AMOUNT_FIELD: 4, INVESTMENT_AMOUNT_FIELD: 5}
+SUBSID_AMOUNT_FIELDS = {"Пополнение оборотных средств": POS_AMOUNT_FIELD, "Инвестиционный": INVESTMENT_AMOUNT_FIELD}
+REPAYMENT_PROCEDURE_KEYS = {
+    "Аннуитетный": "{F4}{ENTER}",
+    "Равными долями": "{F4}{DOWN}{ENTER}",
+    "Индивидуальный": "{F4}{DOWN 2}{ENTER}",
+}
+
+
 def change_sums(win: UiaWindow, form: UiaPane, goto_button: UiaButton, contract: Contract) -> None:
     """
     :param win: Главное окно 1С
@@ -308,7 +440,7 @@ def change_sums(win: UiaWindow, form: UiaPane, goto_button: UiaButton, contract:
     Заполнение данных в форме проекта во вкладке "БВУ/Рефинансирование" в зависимости от цели кредитования
     (Сумма субсидирования, На инвестиции, На ПОС)
     """
-    if contract.credit_purpose not in {"Пополнение оборотных средств", "Инвестиционный", "Инвестиционный + ПОС"}:
+    if contract.credit_purpose not in CREDIT_PURPOSES:
         raise ValueError(f"Don't know what to do with {contract.credit_purpose!r}...")
 
     a(win, lambda: child_win(form, title="БВУ/Рефинансирование", ctrl="TabItem").click_input())
@@ -324,21 +456,26 @@ def change_sums(win: UiaWindow, form: UiaPane, goto_button: UiaButton, contract:
         text(child_win(list_win, ctrl="Custom", idx=6)).replace(" Не возобновляемая часть", ""), default=0.0
     )
 
+    existing_amounts = {POS_AMOUNT_FIELD: existing_pos_amount, INVESTMENT_AMOUNT_FIELD: existing_investment_amount}
+
     a(win, lambda: send_keys("{ENTER}", pause=0.2))
 
     # record_win = child_win(win, ctrl="Pane", idx=56)
 
-    if contract.credit_purpose == "Пополнение оборотных средств" and existing_pos_amount != contract.subsid_amount:
-        a(win, lambda: send_keys("{TAB 4}" + str(contract.subsid_amount), pause=0.1))
-    elif contract.credit_purpose == "Инвестиционный" and existing_investment_amount != contract.subsid_amount:
-        a(win, lambda: send_keys("{TAB 5}" + str(contract.subsid_amount), pause=0.1))
-    elif contract.credit_purpose == "Инвестиционный + ПОС":
+    pos_tabs = AMOUNT_FIELD_TABS[POS_AMOUNT_FIELD]
+    investment_tabs = AMOUNT_FIELD_TABS[INVESTMENT_AMOUNT_FIELD]
+
+    if (field := SUBSID_AMOUNT_FIELDS.get(contract.credit_purpose)) is not None:
+        if existing_amounts[field] != contract.subsid_amount:
+            tabs = AMOUNT_FIELD_TABS[field]
+            a(win, lambda: send_keys(f"{{TAB {tabs}}}{contract.subsid_amount}", pause=0.1))
+    else:
         if existing_pos_amount != contract.pos_amount and existing_investment_amount != contract.investment_amount:
-            a(win, lambda: send_keys("{TAB 4}" + str(contract.pos_amount) + "{TAB}" + str(contract.investment_amount)))
+            a(win, lambda: send_keys(f"{{TAB {pos_tabs}}}{contract.pos_amount}{{TAB}}{contract.investment_amount}"))
         elif existing_pos_amount != contract.pos_amount:
-            a(win, lambda: send_keys("{TAB 4}" + str(contract.subsid_amount), pause=0.1))
+            a(win, lambda: send_keys(f"{{TAB {pos_tabs}}}{contract.subsid_amount}", pause=0.1))
         elif existing_investment_amount != contract.investment_amount:
-            a(win, lambda: send_keys("{TAB 5}" + str(contract.subsid_amount), pause=0.1))
+            a(win, lambda: send_keys(f"{{TAB {investment_tabs}}}{contract.subsid_amount}", pause=0.1))
 
     a(win, lambda: send_keys("{ESC}", pause=0.5))
     with suppress(ElementNotFoundError):
@@ -346,6 +483,14 @@ def change_sums(win: UiaWindow, form: UiaPane, goto_button: UiaButton, contract:
     a(win, lambda: send_keys("{ESC}", pause=0.5))
 
 
+def choose_file(one_c: App, file_path: str) -> None:
+    with one_c.win32_backend() as app:
+        file_dialog = app.window(title_re="Выберите ф.+")
+        file_dialog.wait(wait_for="visible")
+        file_dialog["&Имя файла:Edit"].set_text(file_path)
+        file_dialog.child_window(title="&Открыть", class_name="Button").click()
+
+
 def add_vypiska(one_c: App, win: UiaWindow, form: UiaPane, contract: Contract) -> None:
     """
     :param one_c: Главный объект
@@ -372,7 +517,7 @@ def add_vypiska(one_c: App, win: UiaWindow, form: UiaPane, contract: Contract) -
 
     a(win, lambda: child_win(sort_win, title="OK", ctrl="Button").click_input())
 
-    sleep(1)
+    wait_for(lambda: not sort_win.exists(timeout=0), timeout=5)
 
     if contains_text(child_win(form, ctrl="Table")):
         return
@@ -381,15 +526,11 @@ def add_vypiska(one_c: App, win: UiaWindow, form: UiaPane, contract: Contract) -
     a(win, lambda: child_win(win, ctrl="Edit", idx=5).click_input())
     a(win, lambda: send_keys("{F4}"))
 
-    one_c.switch_backend("win32")
-    save_dialog = one_c.app.window(title="Выберите файл")
-    save_dialog["&Имя файла:Edit"].set_text(file_path)
-    a(win, lambda: save_dialog.child_win(title="&Открыть", class_name="Button").click_input())
-    one_c.switch_backend("uia")
+    choose_file(one_c, file_path)
 
-    if (child_win(win, title="Value is not of object type (Сессия)", ctrl="Pane")).exists():
+    if (error_pane := child_win(win, title="Value is not of object type (Сессия)", ctrl="Pane")).exists():
         a(win, lambda: child_win(win, title="OK", ctrl="Button").click_input())
-        sleep(1)
+        wait_for(lambda: not error_pane.exists(timeout=0), timeout=5)
 
     a(win, lambda: child_win(win, title="OK", ctrl="Button", idx=1).click_input())
 
@@ -404,39 +545,63 @@ def fill_contract_details(win: UiaWindow, ds_form: UiaPane, contract: Contract,
     # FIXME POS CHANGES INDICES
 
     # child_window(ds_form, ctrl="Edit", idx=2).set_text(contract.ds_id)
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=20), contract.iban, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=12), contract.ds_id, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=13), contract.ds_date, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=7), contract.dbz_id, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=8), contract.dbz_date, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=9), contract.dbz_date, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=10), contract.end_date, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=11), rate.nominal_rate, ent=True))
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=14), contract.loan_amount, ent=True))
+    fields = edits(ds_form)
+    a(win, lambda: click_type_keys(fields[20], contract.iban, ent=True))
+    # Fields 12-13 and 7-11 follow each other in the form's tab order, so each run is typed in one go
+    a(win, lambda: click_type_keys(fields[12], tab_join(contract.ds_id, contract.ds_date), ent=True))
+    a(
+        win,
+        lambda: click_type_keys(
+            fields[7],
+            tab_join(contract.dbz_id, contract.dbz_date, contract.dbz_date, contract.end_date, rate.nominal_rate),
+            ent=True,
+        ),
+    )
+    a(win, lambda: click_type_keys(fields[14], contract.loan_amount, ent=True))
 
     if contract.credit_purpose == "Пополнение оборотных средств":
-        a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=4), rate.rate_fee_one_two_three_year, ent=True))
-        a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=18), contract.pos_amount, ent=True))
+        a(win, lambda: click_type_keys(fields[4], rate.rate_fee_one_two_three_year, ent=True))
+        a(win, lambda: click_type_keys(fields[18], contract.pos_amount, ent=True))
     elif contract.credit_purpose == "Инвестиционный":
-        a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=19), contract.investment_amount, ent=True))
+        a(win, lambda: click_type_keys(fields[19], contract.investment_amount, ent=True))
     elif contract.credit_purpose == "Инвестиционный + ПОС":
-        a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=18), contract.pos_amount, ent=True))
-        a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=19), contract.investment_amount, ent=True))
+        a(win, lambda: click_type_keys(fields[18], contract.pos_amount, ent=True))
+        a(win, lambda: click_type_keys(fields[19], contract.investment_amount, ent=True))
     else:
         raise ValueError(f"Don't know what to do with {contract.credit_purpose!r}...")
 
-    a(win, lambda: click_type_keys(child_win(ds_form, ctrl="Edit", idx=3), contract.decision_date, ent=True))
+    a(win, lambda: click_type_keys(fields[3], contract.decision_date, ent=True))
 
     # Вид погашения платежа - Аннуитетный/Равными долями/Индивидуальный
-    a(win, lambda: child_win(ds_form, ctrl="Edit", idx=17).click_input())
-    if contract.repayment_procedure == "Аннуитетный":
-        a(win, lambda: send_keys("{F4}{ENTER}", pause=0.5))
-    elif contract.repayment_procedure == "Равными долями":
-        a(win, lambda: send_keys("{F4}{DOWN}{ENTER}", pause=0.5))
-    elif contract.repayment_procedure == "Индивидуальный":
-        a(win, lambda: send_keys("{F4}{DOWN 2}{ENTER}", pause=0.5))
-    else:
+    if (repayment_keys := REPAYMENT_PROCEDURE_KEYS.get(contract.repayment_procedure)) is None:
         raise ValueError(f"Don't know what to do with {contract.repayment_procedure!r}...")
+    a(win, lambda: fields[17].click_input())
+    a(win, lambda: send_keys(repayment_keys, pause=0.5))
+
+
+DS_STATUS_COLUMNS = {"Договор субсидирования": 1, "Дата применения нового статуса": 2, "Новый статус": 3}
+
+
+def ds_status_cells(table: UiaTable) -> dict[str, UiaCustom]:
+    cells = {}
+    for column, idx in DS_STATUS_COLUMNS.items():
+        cell = child_win(table, ctrl="Custom", idx=idx)
+        if column in text(cell):
+            cells[column] = cell
+    if len(cells) == len(DS_STATUS_COLUMNS):
+        return cells
+
+    logging.warning("Unexpected column layout in the status table, scanning all cells")
+    cells = {}
+    for cell in table.iter_children():
+        txt = cast(str, cell.window_text())
+        for column in DS_STATUS_COLUMNS:
+            if column not in cells and column in txt:
+                cells[column] = cell
+
+    if missing := [column for column in DS_STATUS_COLUMNS if column not in cells]:
+        raise ElementNotFoundError(f"Status table columns not found: {missing!r}")
+    return cells
 
 
 def fill_contract(one_c: App, win: UiaWindow, form: UiaPane, contract: Contract, rate: InterestRate) -> UiaPane:
@@ -458,52 +623,22 @@ def fill_contract(one_c: App, win: UiaWindow, form: UiaPane, contract: Contract,
     change_ds_status_form = child_win(win, ctrl="Pane", idx=74)
 
     table = child_win(change_ds_status_form, ctrl="Table")
+    cells = ds_status_cells(table)
 
-    contract_field = child_win(table, ctrl="Custom", idx=1)
-    existing_contract = text(contract_field).replace(" Договор субсидирования", "")
-    if not existing_contract:
-        a(win, lambda: click_type_keys(contract_field, "{F4}", double=True, pause=0.1))
-        dict_win = child_win(win, ctrl="Pane", idx=88)
-        a(win, lambda: child_win(dict_win, ctrl="Button", title="Set list filter and sort options...").click_input())
-        sort_win = one_c.app.window(title="Filter and Sort")
-
-        check(child_win(sort_win, title="Deletion mark", ctrl="CheckBox"))
-        check(child_win(sort_win, title="Номер договора субсидирования", ctrl="CheckBox"))
-
-    a(win, lambda: click_type_keys(child_win(table, ctrl="Custom", idx=2), contract.ds_date, double=True, ent=True))
-    a(win, lambda: click_type_keys(child_win(table, ctrl="Custom", idx=3), "Подписан ДС", double=True, ent=True, spaces=True))
-
-    for i, cell in enumerate(iter_children(table)):
-        txt = text(cell)
-        if not txt:
-            continue
-
-        value, column = txt.split(" ", maxsplit=1)
-        print(i, value, column)
-
-        if column == "Договор субсидирования":
-            a(win, lambda: click_type_keys(cell, "{F4}", double=True, pause=0.1))
-            dict_win = child_win(win, ctrl="Pane", idx=88)
-            a(win, lambda: child_win(dict_win, ctrl="Button", title="Set list filter and sort options...").click_input())
-            sort_win = one_c.app.window(title="Filter and Sort")
-
-            check(child_win(sort_win, title="Deletion mark", ctrl="CheckBox"))
-            check(child_win(sort_win, title="Номер договора субсидирования", ctrl="CheckBox"))
-
-            # a(
-            #     win,
-            #     lambda: click_type_keys(
-            #         child_win(sort_win, ctrl="Edit", idx=7), fname, spaces=True, escape_chars=True
-            #     ),
-            # )
+    # Always re-select the contract so a stale value left in the cell is overwritten
+    contract_cell = cells["Договор субсидирования"]
+    a(win, lambda: click_type_keys(contract_cell, "{F4}", double=True, pause=0.1))
+    dict_win = child_win(win, ctrl="Pane", idx=88)
+    a(win, lambda: child_win(dict_win, ctrl="Button", title="Set list filter and sort options...").click_input())
+    sort_win = one_c.app.window(title="Filter and Sort")
 
-            a(win, lambda: click_type_keys(cell, contract.ds_id + "{ENTER 2}", pause=0.1))
+    check(child_win(sort_win, title="Deletion mark", ctrl="CheckBox"))
+    check(child_win(sort_win, title="Номер договора субсидирования", ctrl="CheckBox"))
 
-        if column == "Дата применения нового статуса":
-            a(win, lambda: click_type_keys(cell, contract.ds_date, double=True))
+    a(win, lambda: click_type_keys(contract_cell, contract.ds_id + "{ENTER 2}", pause=0.1))
 
-        if "Новый статус" in column:
-            a(win, lambda: click_type_keys(cell, "Подписан ДС", double=True, spaces=True))
+    a(win, lambda: click_type_keys(cells["Дата применения нового статуса"], contract.ds_date, double=True, ent=True))
+    a(win, lambda: click_type_keys(cells["Новый статус"], "Подписан ДС", double=True, ent=True, spaces=True))
 
     a(win, lambda: child_win(change_ds_status_form, title="OK", ctrl="Button").click_input())
     if (close_button := child_win(win, ctrl="Pane", idx=18).child_window(title="Close", control_type="Button")).exists():
@@ -512,90 +647,85 @@ def fill_contract(one_c: App, win: UiaWindow, form: UiaPane, contract: Contract,
     return ds_form
 
 
-def process_contract(contract: Contract, rate: InterestRate) -> None:
-    with App(app_path=r"C:\Users\robot3\Desktop\damu_1c\test_base.v8i") as one_c:
-        win = window(one_c.app, title="Конфигурация.+", regex=True)
-        win.wait(wait_for="exists", timeout=20)
-
-        find_project(top_win=win, contract=contract)
+def process_contract(one_c: App, contract: Contract, rate: InterestRate) -> None:
+    win = window(one_c.app, title="Конфигурация.+", regex=True)
+    win.wait(wait_for="exists", timeout=20)
 
-        form = child_win(win, ctrl="Pane", idx=27)
+    find_project(top_win=win, contract=contract)
 
-        fill_main_project_data(win, form, contract)
+    form = child_win(win, ctrl="Pane", idx=27)
 
-        goto_button = child_win(form, title="Go to", ctrl="Button")
-        change_date(win, form, goto_button, contract.protocol_date)
-        change_sums(win, form, goto_button, contract)
-        add_vypiska(one_c, win, form, contract)
-        check_project_type(win, form, contract)
+    fill_main_project_data(win, form, contract)
 
-        ds_form = fill_contract(one_c, win, form, contract, rate)
+    goto_button = child_win(form, title="Go to", ctrl="Button")
+    change_date(win, form, goto_button, contract.protocol_date)
+    change_sums(win, form, goto_button, contract)
+    add_vypiska(one_c, win, form, contract)
+    check_project_type(win, form, contract)
 
-        # act(top_win, lambda: child_window(change_ds_status_form, title="Закрыть", ctrl="Button").click_input())
-        # act(top_win, lambda: child_window(top_win, title="No", ctrl="Button").click_input())
+    ds_form = fill_contract(one_c, win, form, contract, rate)
 
-        a(win, lambda: child_win(ds_form, title="Записать", ctrl="Button").click_input())
+    # act(top_win, lambda: child_window(change_ds_status_form, title="Закрыть", ctrl="Button").click_input())
+    # act(top_win, lambda: child_window(top_win, title="No", ctrl="Button").click_input())
 
-        a(win, lambda: child_win(ds_form, title="ПрикрепленныеДокументы", ctrl="TabItem").click_input())
+    a(win, lambda: child_win(ds_form, title="Записать", ctrl="Button").click_input())
 
-        a(win, lambda: child_win(ds_form, title="Add", ctrl="Button").click_input())
-        sleep(1)
-        a(win, lambda: send_keys("{F4}"))
+    a(win, lambda: child_win(ds_form, title="ПрикрепленныеДокументы", ctrl="TabItem").click_input())
 
-        one_c.switch_backend("win32")
-        save_dialog = one_c.app.window(title_re="Выберите ф.+")
-        save_dialog["&Имя файла:Edit"].set_text(str(contract.document_path))
-        a(win, lambda: save_dialog.child_win(title="&Открыть", class_name="Button").click_input())
-        one_c.switch_backend("uia")
+    a(win, lambda: child_win(ds_form, title="Add", ctrl="Button").click_input())
+    sleep(1)
+    a(win, lambda: send_keys("{F4}"))
 
-        if (child_win(win, title="Value is not of object type (Сессия)", ctrl="Pane")).exists():
-            a(win, lambda: child_win(win, title="OK", ctrl="Button").click_input())
-            sleep(1)
+    choose_file(one_c, str(contract.document_path))
 
-        a(win, lambda: child_win(win, title="OK", ctrl="Button", idx=2).click_input())
+    if (error_pane := child_win(win, title="Value is not of object type (Сессия)", ctrl="Pane")).exists():
+        a(win, lambda: child_win(win, title="OK", ctrl="Button").click_input())
+        wait_for(lambda: not error_pane.exists(timeout=0), timeout=5)
 
-        a(win, lambda: child_win(ds_form, title="Открыть текущий График погашения", ctrl="Button").click_input())
-        a(win, lambda: child_win(win, title="Yes", ctrl="Button").click_input())
+    a(win, lambda: child_win(win, title="OK", ctrl="Button", idx=2).click_input())
 
-        sleep(5)
+    a(win, lambda: child_win(ds_form, title="Открыть текущий График погашения", ctrl="Button").click_input())
+    a(win, lambda: child_win(win, title="Yes", ctrl="Button").click_input())
 
-        table_form = child_win(win, ctrl="Pane", idx=63)
-        a(win, lambda: child_win(table_form, ctrl="Edit", idx=9).click_input())
-        a(win, lambda: send_keys("13{ENTER}"))
-        a(win, lambda: child_win(table_form, ctrl="Edit", idx=5).click_input())
-        a(win, lambda: send_keys(contract.start_date + "{ENTER}"))
-        a(win, lambda: child_win(table_form, ctrl="Edit", idx=6).click_input())
-        a(win, lambda: send_keys(contract.end_date + "{ENTER}"))
+    # Pane 63 is there before the schedule opens, its load button only shows up with the form itself
+    load_button = child_win(win, title="Загрузить из внешней таблицы (обн)", ctrl="Button")
+    if not wait_for(lambda: load_button.exists(timeout=0) and load_button.is_enabled(), timeout=15):
+        raise ElementNotFoundError("Repayment schedule form did not open")
+    table_form = child_win(win, ctrl="Pane", idx=63)
+    table_fields = edits(table_form)
+    a(win, lambda: table_fields[9].click_input())
+    a(win, lambda: send_keys("13{ENTER}"))
+    a(win, lambda: table_fields[5].click_input())
+    a(win, lambda: send_keys(contract.start_date + "{ENTER}"))
+    a(win, lambda: table_fields[6].click_input())
+    a(win, lambda: send_keys(contract.end_date + "{ENTER}"))
 
-        a(win, lambda: child_win(table_form, title="Загрузить из внешней таблицы (обн)", ctrl="Button").click_input())
+    a(win, lambda: child_win(table_form, title="Загрузить из внешней таблицы (обн)", ctrl="Button").click_input())
 
-        # r"C:\Users\robot3\Desktop\damu_1c\downloads\2025-02-26\shifted.xlsx"
+    # r"C:\Users\robot3\Desktop\damu_1c\downloads\2025-02-26\shifted.xlsx"
 
-        one_c.switch_backend("win32")
-        save_dialog = one_c.app.window(title_re="Выберите ф.+")
-        save_dialog["&Имя файла:Edit"].set_text(r"C:\Users\robot3\Desktop\damu_1c\downloads\2025-02-26\shifted.xlsx")
-        a(win, lambda: save_dialog.child_win(title="&Открыть", class_name="Button").click_input())
-        one_c.switch_backend("uia")
+    choose_file(one_c, r"C:\Users\robot3\Desktop\damu_1c\downloads\2025-02-26\shifted.xlsx")
 
-        if (close_button := child_win(win, ctrl="Pane", idx=18).child_window(title="Close", control_type="Button")).exists():
-            a(win, lambda: close_button.click_input())
+    if (close_button := child_win(win, ctrl="Pane", idx=18).child_window(title="Close", control_type="Button")).exists():
+        a(win, lambda: close_button.click_input())
 
-        a(win, lambda: child_win(table_form, title="Записать", ctrl="Button").click_input())
-        a(win, lambda: child_win(table_form, title="Закрыть", ctrl="Button").click_input())
+    a(win, lambda: child_win(table_form, title="Записать", ctrl="Button").click_input())
+    a(win, lambda: child_win(table_form, title="Закрыть", ctrl="Button").click_input())
 
-        a(win, lambda: child_win(ds_form, title="Передать на проверку", ctrl="Button").click_input())
+    a(win, lambda: child_win(ds_form, title="Передать на проверку", ctrl="Button").click_input())
 
-        # pass
-        #
-        # for _ in range(row_count):
-        #     act(top_win, lambda: delete_button.click_input())
-        #
-        # act(top_win, lambda: query_document_box_obj.click_input())
-        # query_document_box_obj.type_keys("{ESC}")
+    # pass
+    #
+    # for _ in range(row_count):
+    #     act(top_win, lambda: delete_button.click_input())
+    #
+    # act(top_win, lambda: query_document_box_obj.click_input())
+    # query_document_box_obj.type_keys("{ESC}")
 
 
 def main() -> None:
     logger.setup_logger(project_folder)
+    check_env()
 
     if sys.version_info.major != 3 or sys.version_info.minor != 12:
         error_msg = f"Python {sys.version_info} is not supported"
@@ -616,13 +746,21 @@ def main() -> None:
 
     database = resources_folder / "database.sqlite"
     with DatabaseManager(database) as db:
-        for contract in Contract.iter_contracts(db):
+        tasks: list[tuple[Contract, InterestRate]] = []
+        for contract, rate in Contract.iter_contracts_with_rates(db):
             if contract.project is None:
                 continue
 
-            rate = InterestRate.load(db, contract.contract_id)
+            if rate is None:
+                logging.warning(f"{contract.contract_id=} has no interest rate")
+                continue
+
+            tasks.append((contract, rate))
 
-            process_contract(contract, rate)
+        # The pane indices used in process_contract only hold in a fresh session, so every contract gets its own client
+        for contract, rate in tasks:
+            with App(app_path=ONE_C_BASE_PATH) as one_c:
+                process_contract(one_c, contract, rate)
 
 
 if __name__ == "__main__":
@@ -1,20 +1,22 @@
 import email.utils
 import io
 import logging
+import mmap
 import os
-import shutil
-import smtplib
+import random
+import threading
 import traceback
 import urllib.parse
-from email.mime.application import MIMEApplication
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from functools import wraps
+import zipfile
+from contextlib import suppress
+from email.message import EmailMessage
+from functools import lru_cache, wraps
 from pathlib import Path
-from typing import Callable, cast
+from time import sleep
+from typing import Callable
 
+import certifi
 import PIL.Image as Image
-import PIL.ImageGrab as ImageGrab
 import requests
 import requests.adapters
 from requests import HTTPError
@@ -23,18 +25,52 @@ from requests.exceptions import SSLError
 from src.data import Job
 
 
+def make_session() -> requests.Session:
+    session = requests.Session()
+    # No adapter-level retries: POSTs are not retried by urllib3 by default and
+    # send_with_retry owns the backoff, so stacking both would multiply attempts
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4, pool_maxsize=8, max_retries=0
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    session.verify = certifi.where()
+    return session
+
+
+@lru_cache(maxsize=1)
+def fallback_session() -> requests.Session:
+    session = requests.Session()
+    session.verify = certifi.where()
+    return session
+
+
 class TelegramAPI:
     def __init__(self) -> None:
-        self.session = requests.Session()
-        self.session.mount("http://", requests.adapters.HTTPAdapter(max_retries=5))
+        self.session = make_session()
         self.token, self.chat_id = os.environ["TOKEN"], os.environ["CHAT_ID"]
         self.api_url = f"https://api.telegram.org/bot{self.token}/"
 
         self.pending_messages: list[str] = []
+        self.last_response: requests.Response | None = None
+
+        self._encode_buffer = io.BytesIO()
+        self._encode_lock = threading.Lock()
 
     def reload_session(self) -> None:
-        self.session = requests.Session()
-        self.session.mount("http://", requests.adapters.HTTPAdapter(max_retries=5))
+        self.session.close()
+        self.session = make_session()
+
+    def encode_jpeg(self, media: Image.Image) -> bytes:
+        with self._encode_lock:
+            buffer = self._encode_buffer
+            buffer.seek(0)
+            buffer.truncate()
+            media.save(
+                buffer, format="JPEG", quality=75, progressive=True, subsampling=2
+            )
+            return buffer.getvalue()
 
     def send_message(
         self,
@@ -42,6 +78,7 @@ class TelegramAPI:
         media: Image.Image | None = None,
         use_session: bool = True,
         use_md: bool = False,
+        queue_on_rate_limit: bool = True,
     ) -> bool:
         send_data: dict[str, str | None] = {"chat_id": self.chat_id}
 
@@ -60,28 +97,17 @@ class TelegramAPI:
         else:
             url = urllib.parse.urljoin(self.api_url, "sendPhoto")
 
-            image_stream = io.BytesIO()
-            if media is None:
-                media = ImageGrab.grab()
-            media.save(image_stream, format="JPEG", optimize=True)
-            image_stream.seek(0)
-            raw_io_base_stream = cast(io.RawIOBase, image_stream)
-            buffered_reader = io.BufferedReader(raw_io_base_stream)
-
-            files = {"photo": buffered_reader}
+            files = {"photo": ("screenshot.jpg", self.encode_jpeg(media), "image/jpeg")}
 
             send_data["caption"] = message
 
         status_code = 0
 
         try:
-            if use_session:
-                response = self.session.post(
-                    url, data=send_data, files=files, verify=False
-                )
-            else:
-                response = requests.post(url, data=send_data, files=files, verify=False)
+            session = self.session if use_session else fallback_session()
+            response = session.post(url, data=send_data, files=files)
 
+            self.last_response = response
             data = "" if not hasattr(response, "json") else response.json()
             status_code = response.status_code
             logging.info(f"{status_code=}")
@@ -94,7 +120,7 @@ class TelegramAPI:
 
             return False
         except (SSLError, HTTPError) as err:
-            if status_code == 429:
+            if status_code == 429 and queue_on_rate_limit:
                 self.pending_messages.append(message)
 
             logging.exception(err)
@@ -108,20 +134,14 @@ class TelegramAPI:
 
             url = urllib.parse.urljoin(self.api_url, "sendPhoto")
 
-            image_stream = io.BytesIO()
             if media is None:
-                media = ImageGrab.grab()
-            media.save(image_stream, format="JPEG", optimize=True)
-            image_stream.seek(0)
-            raw_io_base_stream = cast(io.RawIOBase, image_stream)
-            buffered_reader = io.BufferedReader(raw_io_base_stream)
+                import PIL.ImageGrab as ImageGrab
 
-            files = {"photo": buffered_reader}
+                media = ImageGrab.grab()
+            files = {"photo": ("screenshot.jpg", self.encode_jpeg(media), "image/jpeg")}
 
-            if use_session:
-                response = self.session.post(url, data=send_data, files=files)
-            else:
-                response = requests.post(url, data=send_data, files=files)
+            session = self.session if use_session else fallback_session()
+            response = session.post(url, data=send_data, files=files)
 
             data = "" if not hasattr(response, "json") else response.json()
             logging.info(f"{response.status_code=}")
@@ -135,23 +155,43 @@ class TelegramAPI:
     def send_with_retry(
         self,
         message: str,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        jitter: float = 0.5,
     ) -> bool:
-        retry = 0
-        while retry < 5:
+        for attempt in range(max_retries + 1):
+            self.last_response = None
             try:
-                use_session = retry < 5
-                success = self.send_message(message, use_session)
-                return success
-            except (
-                requests.exceptions.ConnectionError,
-                requests.exceptions.SSLError,
-                requests.exceptions.HTTPError,
-            ) as e:
+                use_session = attempt < max_retries
+                if self.send_message(
+                    message, use_session=use_session, queue_on_rate_limit=False
+                ):
+                    return True
+            except requests.exceptions.RequestException as e:
                 self.reload_session()
                 logging.exception(e)
-                logging.warning(f"{e} intercepted. Retry {retry + 1}/10")
-                retry += 1
 
+            response = self.last_response
+            status_code = response.status_code if response is not None else None
+            if status_code in range(400, 500) and status_code not in (408, 429):
+                # The request itself is rejected, re-sending it later would fail the same way
+                return False
+
+            if attempt == max_retries:
+                break
+
+            delay = base_delay * 2**attempt * (1 + random.random() * jitter)
+            delay = min(max_delay, delay)
+            if status_code == 429:
+                with suppress(TypeError, ValueError):
+                    retry_after = float(response.headers.get("Retry-After"))
+                    delay = min(max(retry_after, 0.0), max_delay)
+
+            logging.warning(f"Retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            sleep(delay)
+
+        self.pending_messages.append(message)
         return False
 
 
@@ -173,31 +213,48 @@ def handle_error(func: Callable[..., any]) -> Callable[..., any]:
                 error_traceback = f"@{developer} {error_traceback}"
 
             if bot:
-                bot.send_message(message=error_traceback, media=ImageGrab.grab())
+                import PIL.ImageGrab as ImageGrab
+
+                screenshot = ImageGrab.grab()
+                try:
+                    bot.send_message(message=error_traceback, media=screenshot)
+                finally:
+                    screenshot.close()
             raise error
 
     return wrapper
 
 
 def attach_file(
-    msg: MIMEMultipart, file_path: Path, file_name: str | None = None
+    msg: EmailMessage, file_path: Path, file_name: str | None = None
 ) -> None:
     if not file_name:
         file_name = file_path.name
-    with open(file_path, "rb") as f:
-        file_part = MIMEApplication(f.read())
-    file_part.add_header("Content-Disposition", "attachment", filename=file_name)
-    msg.attach(file_part)
+    attachment = {"maintype": "application", "subtype": "octet-stream"}
+    if file_path.stat().st_size == 0:
+        msg.add_attachment(b"", filename=file_name, **attachment)
+        return
+    # Map the file instead of reading it so the raw bytes are never copied into Python
+    with (
+        open(file_path, "rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+        memoryview(mapped) as view,
+    ):
+        msg.add_attachment(view, filename=file_name, **attachment)
 
 
 def send_mail(job: Job, is_empty: bool) -> bool:
+    import smtplib
+
+    from src.utils.utils import finalize_report
+
     mail_info = job.mail_info
     t_range = job.t_range
     job_name = job.job_type.name
 
     recipients_lst: list[str] = list(filter(bool, mail_info.recipients.split(";")))
 
-    msg = MIMEMultipart()
+    msg = EmailMessage()
     msg["From"] = mail_info.sender
     msg["To"] = mail_info.recipients
     msg["Date"] = email.utils.formatdate(localtime=True)
@@ -210,24 +267,34 @@ def send_mail(job: Job, is_empty: bool) -> bool:
     else:
         body += f"\n\nПриказы на период с {t_range.start.short} по {t_range.end.short}."
 
+    logging.info(f"{body=}")
+    # The body has to be set before add_attachment turns the message into multipart
+    msg.set_content(body, subtype="html")
+
+    if not is_empty:
+        finalize_report(mail_info.report_path)
         attach_file(msg, mail_info.report_path)
 
-        archive_name = f"screenshots_{t_range.end.short}"
-        original_zip_path = shutil.make_archive(
-            base_name=archive_name, format="zip", root_dir=mail_info.screenshot_folder
-        )
-        archive_name = f"{archive_name}.zip"
-        screenshot_archive_path = mail_info.screenshot_folder / archive_name
-        shutil.move(original_zip_path, screenshot_archive_path)
+        archive_name = f"screenshots_{t_range.end.short}.zip"
+        screenshot_folder = mail_info.screenshot_folder_path()
+        screenshot_archive_path = screenshot_folder / archive_name
+        # Screenshots are already compressed images, deflating them only burns CPU
+        with zipfile.ZipFile(
+            screenshot_archive_path, "w", compression=zipfile.ZIP_STORED
+        ) as archive:
+            for path in screenshot_folder.rglob("*"):
+                if path.is_file() and path != screenshot_archive_path:
+                    archive.write(path, path.relative_to(screenshot_folder))
 
         attach_file(msg, screenshot_archive_path, archive_name)
 
-    logging.info(f"{body=}")
-    msg.attach(MIMEText(body, "html", "utf-8"))
-
     try:
         with smtplib.SMTP(mail_info.server, 25) as smtp:
-            response = smtp.sendmail(mail_info.sender, recipients_lst, msg.as_string())
+            smtp.ehlo()
+            logging.debug(f"{job_name} - SMTP extensions: {smtp.esmtp_features}")
+            response = smtp.send_message(
+                msg, from_addr=mail_info.sender, to_addrs=recipients_lst
+            )
             if response:
                 logging.error(
                     f"{job_name} - Failed to send email to the following recipients:"
@@ -1,27 +1,50 @@
 import dataclasses
+import functools
 import logging
 import os
 import random
 import re
+from contextlib import contextmanager
 from pathlib import Path
-from time import sleep
+from time import monotonic, sleep
 from types import TracebackType
-from typing import Type, Optional, Union, Literal
+from typing import TYPE_CHECKING, Callable, Type, Optional, Union, Literal, Iterable, Iterator
 
-import pyautogui
 import pyperclip
 import pywinauto
 import pywinauto.timings
 import win32con
 import win32gui
-from PIL import ImageGrab, ImageDraw, ImageFont
 from pywinauto import mouse, win32functions
 
 from src.notification import TelegramAPI
 import pywinauto.base_wrapper
+from src.utils.automation import wait_for
 from src.utils.utils import kill_all_processes
 
-pyautogui.FAILSAFE = False
+if TYPE_CHECKING:
+    from PIL import ImageFont
+
+KEYSTROKE_RE = re.compile(r"({.+?})")
+DIALOG_LINE_RE = re.compile(r"[\r\n]+")
+DIALOG_SEPARATOR_RE = re.compile(r"-{3,}")
+
+
+def dialog_message(lines: Iterable[str]) -> str:
+    # Both the UIA texts and the copied dialog end with the message line, separators and blanks aside
+    message = ""
+    for line in lines:
+        line = line.strip()
+        if line and not DIALOG_SEPARATOR_RE.fullmatch(line):
+            message = line
+    return message
+
+
+@functools.lru_cache(maxsize=8)
+def load_font(size: int) -> "ImageFont.FreeTypeFont":
+    from PIL import ImageFont
+
+    return ImageFont.truetype("arial.ttf", size=size)
 
 
 @dataclasses.dataclass(slots=True)
@@ -42,17 +65,21 @@ class AppUtils:
         match img_format:
             case "JPEG" | "JPG":
                 img_format = "JPEG"
-                params = {"optimize": True}
+                params = {"quality": 75, "progressive": True, "subsampling": 2}
             case "PNG":
-                params = {"optimize": True}
+                params = {"compress_level": 1}
             case _:
                 raise ValueError(f"Unsupported format '{img_format}'. Supported formats: 'PNG', 'JPEG', 'JPG'")
 
+        from PIL import ImageGrab
+
         img = ImageGrab.grab()
 
         if text:
+            from PIL import ImageDraw
+
             draw = ImageDraw.Draw(img)
-            font = ImageFont.truetype("arial.ttf", size=34)
+            font = load_font(size=34)
 
             img_width, img_height = img.size
             bbox = draw.textbbox((0, 0), text, font=font)
@@ -65,10 +92,15 @@ class AppUtils:
             text_color = (0, 0, 0)
             draw.text((x_position, y_position), text, font=font, fill=text_color)
 
-        img.save(path, format=img_format, **params)
+        with img:
+            img.save(path, format=img_format, **params)
 
     @staticmethod
     def wiggle_mouse(duration: int) -> None:
+        import pyautogui
+
+        pyautogui.FAILSAFE = False
+
         def get_random_coords() -> tuple[int, int]:
             screen = pyautogui.size()
             width = screen[0]
@@ -121,6 +153,8 @@ class AppUtils:
         if backend:
             self.app.backend.name = backend
 
+        max_retries = retries
+        deadline = monotonic() + 30
         while retries > 0:
             try:
                 if retries % 2 == 0:
@@ -133,7 +167,10 @@ class AppUtils:
                 break
             except (Exception, BaseException):
                 retries -= 1
-                sleep(5)
+                if monotonic() >= deadline:
+                    retries = 0
+                    break
+                sleep(min(2.0, 0.1 * 2 ** (max_retries - retries - 1) * (1 + random.random() * 0.5)))
                 continue
 
         if retries <= 0:
@@ -157,7 +194,7 @@ class AppUtils:
         sleep(delay_before)
 
         AppUtils.set_focus(window)
-        for command in list(filter(None, re.split(r"({.+?})", keystrokes))):
+        for command in filter(None, KEYSTROKE_RE.split(keystrokes)):
             try:
                 window.type_keys(command, set_foreground=False)
             except pywinauto.base_wrapper.ElementNotEnabled:
@@ -220,6 +257,14 @@ class App:
             path=r"C:\Program Files (x86)\1cv8\8.3.25.1394\bin\1cv8.exe"
         )
 
+    @contextmanager
+    def win32_backend(self) -> Iterator[pywinauto.Application]:
+        self.switch_backend("win32")
+        try:
+            yield self.app
+        finally:
+            self.switch_backend("uia")
+
     def open_app(self) -> None:
         for _ in range(10):
             try:
@@ -249,19 +294,47 @@ class App:
         if not dialog_win.exists() or not dialog_win.is_enabled():
             return ""
 
+        try:
+            texts = [txt for element in dialog_win.descendants(control_type="Text") for txt in element.texts() if txt]
+        except (Exception, BaseException) as err:
+            logging.exception(err)
+            texts = []
+
+        if dialog_text := dialog_message(texts):
+            logging.info(f"{texts=}")
+            return dialog_text
+
         pyperclip.copy("")
         dialog_win.type_keys("^C")
-        sleep(2)
+        wait_for(lambda: bool(pyperclip.paste()), timeout=2)
         dialog_text = pyperclip.paste()
         pyperclip.copy("")
         logging.info(f"{dialog_text=}")
 
-        if not dialog_text:
-            return ""
+        return dialog_message(DIALOG_LINE_RE.split(dialog_text))
 
-        dialog_items = re.split("[\r\n]+", dialog_text)
-        dialog_text = dialog_items[-2]
-        return dialog_text
+    @staticmethod
+    def _scan_for_button(
+        probe: Callable[[int], str], start: int, end: int, step: int, target: str, coarse_factor: int
+    ) -> bool:
+        coarse_step = step * coarse_factor
+        prev_point, prev_button = start, probe(start)
+        if prev_button == target:
+            return True
+
+        point = start
+        while point < end:
+            point = min(point + coarse_step, end)
+            button = probe(point)
+            if button == target:
+                return True
+            if button != prev_button:
+                # The status bar text changed, so a button boundary lies in between: rescan it with the fine step
+                for fine_point in range(prev_point + step, point, step):
+                    if probe(fine_point) == target:
+                        return True
+            prev_point, prev_button = point, button
+        return False
 
     def find_and_click_button(
         self,
@@ -275,6 +348,7 @@ class App:
         self.utils.set_focus(window)
 
         status_win = self.app.window(title_re="Банковская система.+")
+        status_bar = status_win["StatusBar"].wrapper_object()
         rectangle = toolbar.rectangle()
         mid_point = rectangle.mid_point()
         mouse.move(coords=(mid_point.x, mid_point.y))
@@ -283,39 +357,31 @@ class App:
         end_point = mid_point.x if horizontal else mid_point.y
 
         x, y = mid_point.x, mid_point.y
-        point = 0
 
         x_offset = offset if horizontal else 0
         y_offset = offset if not horizontal else 0
 
-        error_count = 0
-
-        i = 0
-        while (active_button := status_win["StatusBar"].window_text().strip()) != target_button_name:
-            if point > end_point:
-                logging.error(f"{point=}, {end_point=}")
-                logging.error(f"{active_button=}, f{target_button_name=}")
-
-                point = 0
-                i = 0
-                if step > 5:
-                    step = 5
-
-                error_count += 1
-
-                if error_count >= 3:
-                    raise pywinauto.findwindows.ElementNotFoundError
-                continue
-
-            point = start_point + i * step
-
+        def probe(point: int) -> str:
+            nonlocal x, y
             if horizontal:
                 x = point
             else:
                 y = point
-
             mouse.move(coords=(x, y))
-            i += 1
+            return status_bar.window_text().strip()
+
+        if status_bar.window_text().strip() != target_button_name:
+            found = self._scan_for_button(probe, start_point, end_point, step, target_button_name, coarse_factor=8)
+
+            error_count = 0
+            while not found:
+                if error_count >= 3:
+                    logging.error(f"{start_point=}, {end_point=}, {target_button_name=}")
+                    raise pywinauto.findwindows.ElementNotFoundError
+
+                step = min(step, 5)
+                found = self._scan_for_button(probe, start_point, end_point, step, target_button_name, coarse_factor=1)
+                error_count += 1
 
         x += x_offset
         y += y_offset
@@ -373,19 +439,18 @@ def save_excel(colvir: App, work_folder: Path) -> Path:
     sort_win = colvir.utils.get_window(title="Сортировка")
     sort_win["OK"].click()
 
-    sleep(1)
-    if (error_win := colvir.app.window(title="Произошла ошибка")).exists():
-        error_win.close()
+    error_win = colvir.app.window(title="Произошла ошибка")
 
+    poll = 0.25
     while not orders_file_path.exists():
-        sleep(5)
+        if error_win.exists(timeout=0):
+            error_win.close()
+        sleep(poll)
+        poll = min(poll * 2, 1)
     sleep(1)
 
-    if (error_win := colvir.app.window(title="Произошла ошибка")).exists():
-        error_win.close()
-
     kill_all_processes("EXCEL")
 
-    if (error_win := colvir.app.window(title="Произошла ошибка")).exists():
+    if error_win.exists(timeout=0):
         error_win.close()
     return orders_file_path
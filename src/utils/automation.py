@@ -1,4 +1,4 @@
-from time import time, sleep
+from time import monotonic, sleep
 from typing import (
     overload,
     Literal,
@@ -21,6 +21,8 @@ from pywinauto import WindowSpecification, Application
 from pywinauto.controls.uia_controls import ButtonWrapper, EditWrapper, ListViewWrapper, ListItemWrapper
 from pywinauto.controls.uiawrapper import UIAWrapper
 from pywinauto.keyboard import send_keys
+from pywinauto.uia_defines import IUIA
+from pywinauto.uia_element_info import UIAElementInfo
 
 _WindowWindowSpecification = NewType("_WindowWindowSpecification", WindowSpecification)
 _ButtonWindowSpecification = NewType("_ButtonWindowSpecification", WindowSpecification)
@@ -151,12 +153,19 @@ def children(parent: UiaList) -> List[UiaListItem]:
     return parent.children()
 
 
+def edits(parent: UiaElement) -> List[UiaEdit]:
+    return parent.descendants(control_type="Edit")
+
+
 def wait_for(condition: Callable[[], bool], timeout: float, interval: float = 0.1) -> bool:
-    start = time()
+    deadline = monotonic() + timeout
+    poll = 0.001
     while not condition():
-        if time() - start > timeout:
+        remaining = deadline - monotonic()
+        if remaining <= 0:
             return False
-        sleep(interval)
+        sleep(min(poll, interval, remaining))
+        poll = min(poll * 2, interval)
     return True
 
 
@@ -191,22 +200,33 @@ def click_type_keys(
     send_keys(keystrokes, pause=pause, with_spaces=spaces)
 
 
+def tab_join(*values: Any) -> str:
+    return "{TAB}{DELETE}".join(map(str, values))
+
+
 def check(checkbox: UiaCheckBox) -> None:
     if checkbox.get_toggle_state() == 0:
         checkbox.toggle()
 
 
 def contains_text(element: UiaElement) -> bool:
-    return any((inner.strip() for outer in element.texts() for inner in outer))
+    for outer in element.texts():
+        for inner in outer:
+            if inner.strip():
+                return True
+    return False
 
 
 def text(element: UiaElement) -> str:
     return cast(str, element.window_text())
 
 
+_FLOAT_TRANSLATION = str.maketrans({",": ".", " ": None, "\xa0": None})
+
+
 def text_to_float(txt: str, default: Optional[float] = None) -> float:
     try:
-        res = float(txt.replace(",", "."))
+        res = float(txt.translate(_FLOAT_TRANSLATION))
         return res
     except ValueError as err:
         if isinstance(default, float):
@@ -214,15 +234,47 @@ def text_to_float(txt: str, default: Optional[float] = None) -> float:
         raise err
 
 
-def get_full_text(element: UiaElement) -> str:
-    txt = element.window_text().strip() if element.window_text() else ""
+def cached_subtree(element: UiaElement) -> Any:
+    iuia = IUIA()
+    request = iuia.iuia.CreateCacheRequest()
+    request.AddProperty(iuia.UIA_dll.UIA_NamePropertyId)
+    request.AddProperty(iuia.UIA_dll.UIA_ControlTypePropertyId)
+    request.AddProperty(iuia.UIA_dll.UIA_BoundingRectanglePropertyId)
+    request.AddProperty(iuia.UIA_dll.UIA_ValueValuePropertyId)
+    request.TreeScope = iuia.tree_scope["subtree"]
+    request.TreeFilter = iuia.true_condition
+    return element.element_info.element.BuildUpdatedCache(request)
+
 
-    for child in element.children():
-        child_text = get_full_text(child)
-        if child_text:
-            txt += " " + child_text
+def cached_children(cached_element: Any) -> Generator[Any, None, None]:
+    cached_array = cached_element.GetCachedChildren()
+    if not cached_array:
+        return
+    for i in range(cached_array.Length):
+        yield cached_array.GetElement(i)
+
+
+def cached_text(cached_element: Any) -> str:
+    uia_dll = IUIA().UIA_dll
+    if cached_element.CachedControlType not in (uia_dll.UIA_EditControlTypeId, uia_dll.UIA_DocumentControlTypeId):
+        return cached_element.CachedName or ""
+
+    # Edit/Document contents live in the Value/Text pattern, their Name is usually empty or just a label
+    value = cached_element.GetCachedPropertyValue(uia_dll.UIA_ValueValuePropertyId)
+    if isinstance(value, str) and value:
+        return value
+    return UIAElementInfo(cached_element).rich_text or ""
 
-    return txt.strip()
+
+def get_full_text(element: UiaElement) -> str:
+    parts: List[str] = []
+    stack = [cached_subtree(element)]
+    while stack:
+        cached_element = stack.pop()
+        if txt := cached_text(cached_element).strip():
+            parts.append(txt)
+        stack.extend(reversed(list(cached_children(cached_element))))
+    return " ".join(parts)
 
 
 def print_element_tree(
@@ -243,14 +295,20 @@ def print_element_tree(
     if counters is None:
         counters = {}
 
-    element_ctrl = element.friendly_class_name()
+    _print_cached_tree(cached_subtree(element), max_depth, counters, depth)
+
+
+def _print_cached_tree(cached_element: Any, max_depth: Optional[int], counters: Dict[str, int], depth: int) -> None:
+    control_type_ids = IUIA().known_control_type_ids
+    element_ctrl = control_type_ids.get(cached_element.CachedControlType, "Unknown")
     counters[element_ctrl] = counters.get(element_ctrl, 0) + 1
     element_idx = counters[element_ctrl] - 1
 
-    element_repr = "▏   " * (depth + 1) + f"{element_ctrl}{element_idx} - {text(element)!r} - "
+    element_repr = "▏   " * (depth + 1) + f"{element_ctrl}{element_idx} - {cached_element.CachedName!r} - "
 
     try:
-        element_repr += f"{element.rectangle()}"
+        rect = cached_element.CachedBoundingRectangle
+        element_repr += f"(L{rect.left}, T{rect.top}, R{rect.right}, B{rect.bottom})"
         print(element_repr)
     except COMError:
         element_repr += "(COMError)"
@@ -258,5 +316,5 @@ def print_element_tree(
         return
 
     if max_depth is None or depth < max_depth:
-        for child in iter_children(element):
-            print_element_tree(child, max_depth, counters, depth + 1)
+        for child in cached_children(cached_element):
+            _print_cached_tree(child, max_depth, counters, depth + 1)
@@ -1,59 +1,237 @@
+import contextvars
+import functools
+import itertools
 import logging
+import pickle
+import queue
 import re
 import sqlite3
-from contextlib import contextmanager
+import threading
+from contextlib import contextmanager, suppress
 from pathlib import Path
-from typing import Any, ContextManager, Dict, List, Mapping, Optional, Sequence, Union
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
 
 
 SQLParam = Union[None, int, float, str, bytes, bool]
 SQLParams = Union[Sequence[SQLParam], Mapping[str, SQLParam]]
+RowFactory = Callable[[sqlite3.Cursor, tuple], Any]
+
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-64000;",
+    "PRAGMA mmap_size=268435456;",
+    "PRAGMA foreign_keys=ON;",
+)
+
+
+READ_ONLY_PRAGMAS = (
+    "PRAGMA query_only=ON;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA cache_size=-64000;",
+    "PRAGMA mmap_size=268435456;",
+)
+
+PAGE_SIZE = 8192
+
+_active_session: contextvars.ContextVar[Optional[tuple["DatabaseManager", sqlite3.Connection]]] = contextvars.ContextVar(
+    "active_session", default=None
+)
+
+
+def df_to_blob(df: pd.DataFrame) -> bytes:
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def blob_to_df(blob: bytes) -> pd.DataFrame:
+    try:
+        with pa.ipc.open_stream(pa.py_buffer(blob)) as reader:
+            return reader.read_pandas()
+    except (pa.ArrowInvalid, OSError):
+        # Not an IPC stream: rows written before the switch to Arrow hold pickled frames of any protocol
+        return pickle.loads(blob)
+
+
+@functools.lru_cache(maxsize=128)
+def squash_whitespace(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip()
+
+
+@functools.lru_cache(maxsize=128)
+def is_read_only(query: str) -> bool:
+    return query.lstrip()[:6].upper() == "SELECT"
 
 
 class DatabaseManager:
-    def __init__(self, db_path: Path) -> None:
+    def __init__(self, db_path: Path, pool_size: int = 4) -> None:
         self.db_path = db_path
+        self._pool: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=pool_size)
+        self._read_only_conn: Optional[sqlite3.Connection] = None
+        self._read_only_lock = threading.Lock()
+
+    def _open_connection(self) -> sqlite3.Connection:
+        # Autocommit: multi-statement writes open their own BEGIN, single statements commit on their own
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, cached_statements=256)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _read_only_connection(self) -> sqlite3.Connection:
+        with self._read_only_lock:
+            if self._read_only_conn is None:
+                uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, check_same_thread=False, isolation_level=None, cached_statements=256)
+                for pragma in READ_ONLY_PRAGMAS:
+                    conn.execute(pragma)
+                self._read_only_conn = conn
+            return self._read_only_conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._open_connection()
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _session_connection(self) -> Optional[sqlite3.Connection]:
+        active = _active_session.get()
+        if active is None or active[0] is not self:
+            return None
+        return active[1]
+
+    @contextmanager
+    def session(self) -> Iterator[sqlite3.Connection]:
+        conn = self._session_connection()
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._acquire()
+        token = _active_session.set((self, conn))
+        try:
+            yield conn
+        finally:
+            _active_session.reset(token)
+            self._release(conn)
 
     def connect(self) -> ContextManager[sqlite3.Cursor]:
         @contextmanager
         def wrapped():
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("PRAGMA foreign_keys = ON;")
+            session_conn = self._session_connection()
+            conn = session_conn if session_conn is not None else self._acquire()
             cursor = conn.cursor()
             try:
                 yield cursor
                 conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
             finally:
-                conn.close()
+                cursor.close()
+                if session_conn is None:
+                    self._release(conn)
 
         return wrapped()
 
+    @contextmanager
+    def connect_ro(self) -> Iterator[sqlite3.Cursor]:
+        # Reads never open a write transaction, so skip the commit and let WAL serve them beside the writers
+        conn = self._session_connection() or self._read_only_connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+    connect_rw = connect
+
+    def close(self) -> None:
+        with self._read_only_lock:
+            if self._read_only_conn is not None:
+                self._read_only_conn.close()
+                self._read_only_conn = None
+
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            with suppress(sqlite3.Error):
+                conn.execute("PRAGMA optimize;")
+            conn.close()
+
     def execute(self, query: str, params: Optional[SQLParams] = None) -> Sequence[SQLParam]:
         try:
-            with self.connect() as cursor:
+            with self.connect_ro() if is_read_only(query) else self.connect() as cursor:
                 cursor.execute(query, params or ())
                 return cursor.fetchall()
         except sqlite3.IntegrityError as err:
-            query = re.sub(r"\s+", " ", query).strip()
+            query = squash_whitespace(query)
             logging.error(f"{query!r} with {params=}")
             raise err
         except sqlite3.Error as err:
             logging.error(f"Database error: {err} - {query!r}")
             raise err
 
+    def iter_execute(
+        self,
+        query: str,
+        params: Optional[SQLParams] = None,
+        row_factory: Optional[RowFactory] = None,
+    ) -> Iterator[Any]:
+        try:
+            with self.connect_ro() if is_read_only(query) else self.connect() as cursor:
+                cursor.row_factory = row_factory
+                cursor.execute(query, params or ())
+                yield from cursor
+        except sqlite3.Error as err:
+            logging.error(f"Database error: {err} - {query!r}")
+            raise err
+
     def execute_many(
         self,
         query: str,
         params: Optional[List[Dict[Any, ...]]] = None,
     ) -> None:
         with self.connect() as cursor:
+            cursor.execute("BEGIN")
             cursor.executemany(query, params or ())
 
+    def bulk_insert(self, query: str, rows: Iterable[SQLParams], chunk_size: int = 10_000) -> int:
+        rows = iter(rows)
+        inserted = 0
+        with self.connect() as cursor:
+            cursor.execute("BEGIN IMMEDIATE")
+            while batch := list(itertools.islice(rows, chunk_size)):
+                cursor.executemany(query, batch)
+                inserted += len(batch)
+        return inserted
+
     def execute_script(self, query: str) -> None:
         with self.connect() as cursor:
             cursor.executescript(query)
 
     def prepare_tables(self) -> None:
+        # page_size and auto_vacuum only apply to a database without pages or after a VACUUM outside WAL mode
+        if self.execute("PRAGMA page_size")[0][0] != PAGE_SIZE or self.execute("PRAGMA auto_vacuum")[0][0] != 2:
+            self.execute_script(f"PRAGMA page_size={PAGE_SIZE};PRAGMA auto_vacuum=INCREMENTAL;PRAGMA journal_mode=DELETE;VACUUM;")
+
         self.execute("PRAGMA journal_mode=WAL")
 
         self.execute("""
@@ -145,18 +323,29 @@ class DatabaseManager:
             )
         """)
 
+        self.execute("CREATE INDEX IF NOT EXISTS ix_contracts_bank ON contracts (bank_id)")
+        self.execute("CREATE INDEX IF NOT EXISTS ix_contracts_customer ON contracts (customer_id)")
+        self.execute("CREATE INDEX IF NOT EXISTS ix_contracts_ds ON contracts (ds_id, ds_date)")
+        self.execute("CREATE INDEX IF NOT EXISTS ix_errors_traceback ON errors (id) WHERE traceback IS NOT NULL")
+        self.execute("CREATE INDEX IF NOT EXISTS ix_errors_traceback_null ON errors (id) WHERE traceback IS NULL")
+
     def clean_up(self) -> None:
         self.execute("""
             DELETE FROM errors
             WHERE traceback IS NULL
         """)
 
-        self.execute_script("VACUUM;PRAGMA optimize;")
+        self.execute_script("PRAGMA incremental_vacuum(200);PRAGMA wal_checkpoint(TRUNCATE);PRAGMA optimize;")
 
     def __enter__(self) -> "DatabaseManager":
-        self.prepare_tables()
+        with self.session():
+            self.prepare_tables()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
-        if exc_type is None:
-            self.clean_up()
+        try:
+            if exc_type is None:
+                with self.session():
+                    self.clean_up()
+        finally:
+            self.close()
@@ -1,9 +1,16 @@
+import logging
 from contextlib import contextmanager
+from datetime import time
 from pathlib import Path
-from typing import Generator
+from typing import Any, Generator, Iterable, Tuple
 
 import win32com.client as win32
 
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
 from src.utils.utils import kill_all_processes
 
 
@@ -14,7 +21,17 @@ def dispatch(application: str) -> Generator[win32.Dispatch, None, None]:
     try:
         yield app
     finally:
-        kill_all_processes(proc_name="EXCEL")
+        try:
+            app.Quit()
+        except (Exception, BaseException) as err:
+            logging.exception(err)
+            kill_all_processes(proc_name="EXCEL")
+
+
+@contextmanager
+def excel_session() -> Generator[win32.Dispatch, None, None]:
+    with dispatch(application="Excel.Application") as excel:
+        yield excel
 
 
 @contextmanager
@@ -28,11 +45,59 @@ def workbook_open(
         wb.Close()
 
 
-def xls_to_xlsx(source: Path, dest: Path):
-    kill_all_processes("EXCEL")
-    if dest.exists():
-        dest.unlink()
-    with dispatch(application="Excel.Application") as excel:
+def xls_to_xlsx_batch(pairs: Iterable[Tuple[Path, Path]], excel: win32.Dispatch) -> None:
+    for source, dest in pairs:
+        if dest.exists():
+            dest.unlink()
         with workbook_open(excel=excel, file_path=str(source)) as wb:
             wb.SaveAs(str(dest), FileFormat=51)
+        source.unlink()
+
+
+def xls_cell(cell_type: int, value: Any, datemode: int) -> Any:
+    # xlrd hands dates back as serial floats, openpyxl would write them as plain numbers
+    if cell_type == xlrd.XL_CELL_DATE:
+        dt = xlrd.xldate_as_datetime(value, datemode)
+        return dt.date() if dt.time() == time.min else dt
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    return value
+
+
+def xls_row(sheet: "xlrd.sheet.Sheet", row_idx: int, datemode: int) -> list[Any]:
+    return [
+        xls_cell(cell_type, value, datemode)
+        for cell_type, value in zip(sheet.row_types(row_idx), sheet.row_values(row_idx))
+    ]
+
+
+def xls_to_xlsx_native(source: Path, dest: Path) -> None:
+    import openpyxl
+
+    book = xlrd.open_workbook(str(source), on_demand=True)
+    try:
+        wb = openpyxl.Workbook(write_only=True)
+        for sheet in book.sheets():
+            ws = wb.create_sheet(sheet.name)
+            for row_idx in range(sheet.nrows):
+                ws.append(xls_row(sheet, row_idx, book.datemode))
+        if dest.exists():
+            dest.unlink()
+        wb.save(str(dest))
+    finally:
+        book.release_resources()
     source.unlink()
+
+
+def xls_to_xlsx(source: Path, dest: Path):
+    if xlrd is not None:
+        try:
+            xls_to_xlsx_native(source=source, dest=dest)
+            return
+        except xlrd.XLRDError as err:
+            logging.warning(f"xlrd failed on {source.name!r}, using Excel: {err}")
+
+    with excel_session() as excel:
+        xls_to_xlsx_batch(pairs=[(source, dest)], excel=excel)
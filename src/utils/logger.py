@@ -1,16 +1,29 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
 from datetime import datetime
 from pathlib import Path
+from zoneinfo import ZoneInfo
 
-import pytz
-from rich.console import Console
-from rich.logging import RichHandler
+
+TIMEZONE = ZoneInfo("Asia/Almaty")
+
+
+def almaty_time(secs: float) -> time.struct_time:
+    return datetime.fromtimestamp(secs, TIMEZONE).timetuple()
 
 
 def setup_logger(project_root: Path) -> Path:
-    today = datetime.now(pytz.timezone("Asia/Almaty"))
+    today = datetime.now(TIMEZONE)
 
-    logging.Formatter.converter = lambda *args: today.timetuple()
+    logging.Formatter.converter = staticmethod(almaty_time)
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
 
     log_folder = project_root / "logs"
 
@@ -36,14 +49,28 @@ def setup_logger(project_root: Path) -> Path:
     logging.getLogger("requests").setLevel(logging.WARNING)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
 
-    logger.addHandler(file_handler)
+    # File writes happen on the listener thread, atexit drains the queue before the process ends
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
 
-    logger.addHandler(
-        RichHandler(
-            console=Console(width=255),
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    if os.getenv("LOG_RICH") == "1":
+        from rich.console import Console
+        from rich.logging import RichHandler
+
+        stream_handler = RichHandler(
+            console=Console(width=255, no_color=not sys.stderr.isatty()),
             omit_repeated_times=False,
             rich_tracebacks=False,
         )
-    )
+    else:
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
 
     return logger_file
@@ -28,31 +28,31 @@ class UnsupportedOfficeAppError(Exception):
         super().__init__(message)
 
 
-def validate_format(file_path: str, file_format: FileFormat) -> bool:
-    file_extension = file_path.rsplit(".")[-1]
+FILE_EXTENSIONS = {FileFormat.DOCX: "docx", FileFormat.PDF: "pdf"}
+
 
-    match file_format:
-        case file_format.DOCX:
-            return file_extension == "docx"
-        case file_format.PDF:
-            return file_extension == "pdf"
-        case _:
-            return False
+def validate_format(file_path: str, file_format: FileFormat) -> bool:
+    file_extension = file_path.rpartition(".")[2].lower()
+    return FILE_EXTENSIONS.get(file_format) == file_extension
 
 
 class Office:
-    def __init__(self, file_path: Union[str, Path], office_type: OfficeType) -> None:
+    def __init__(self, file_path: Union[str, Path], office_type: OfficeType, app: Any = None) -> None:
         self.office_type = office_type
+        self.owns_app = app is None
 
         self.file_path: str = str(file_path) if isinstance(file_path, Path) else file_path
         self.project_folder = os.getenv("project_folder")
         if self.project_folder:
             self.file_path = os.path.join(self.project_folder, self.file_path)
-        try:
-            self.app = win32.Dispatch(office_type.value)
-        except AttributeError:
-            shutil.rmtree(win32com.__gen_path__)
-            self.app = win32.Dispatch(office_type.value)
+        if app is not None:
+            self.app = app
+        else:
+            try:
+                self.app = win32.Dispatch(office_type.value)
+            except AttributeError:
+                shutil.rmtree(win32com.__gen_path__)
+                self.app = win32.Dispatch(office_type.value)
 
         self.app.Visible = False
         self.app.DisplayAlerts = False
@@ -112,7 +112,11 @@ class Office:
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
         self.close_doc()
-        self.quit_app()
+        if self.owns_app:
+            self.quit_app()
+
+
+MAIL_ITEMS_FILTER = "@SQL=\"http://schemas.microsoft.com/mapi/proptag/0x001A001F\" LIKE 'IPM.Note%'"
 
 
 @dataclasses.dataclass(slots=True)
@@ -140,18 +144,20 @@ class Outlook:
             mail.Attachments.Add(str(attachment))
         mail.Send()
 
-    def read_inbox(self, folder: str = "Inbox") -> Iterator[Message]:
+    def read_inbox(self, folder: str = "Inbox", load_attachments: bool = False) -> Iterator[Message]:
         inbox = self.namespace.GetDefaultFolder(6)
         if folder.lower() != "inbox":
             inbox = inbox.Folders[folder]
-        for item in inbox.Items:
-            if item.Class == 43:
-                yield Message(
-                    subject=item.Subject,
-                    body=item.Body,
-                    to=item.To,
-                    attachments=[Path(a.FileName) for a in item.Attachments],
-                )
+        # Filter on PR_MESSAGE_CLASS in the store so only mail items (signed/encrypted included) cross COM
+        items = inbox.Items.Restrict(MAIL_ITEMS_FILTER)
+        items.Sort("[ReceivedTime]", True)
+        for item in items:
+            yield Message(
+                subject=item.Subject,
+                body=item.Body,
+                to=item.To,
+                attachments=[Path(a.FileName) for a in item.Attachments] if load_attachments else [],
+            )
 
     def quit_app(self) -> None:
         if not self.app:
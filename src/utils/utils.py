@@ -1,23 +1,37 @@
+import csv
 import logging
 import os
 import secrets
 import string
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 from pathlib import Path
-from typing import cast, Generator
+from typing import Generator
 
 import pandas as pd
 import psutil
-from pandas import Series
 
 from src.data import Order, Job
 
 
+_ONE_DAY = timedelta(days=1)
+
+
 def iterate_datetime(
-    start: datetime, end: datetime, step: timedelta | None = None
-) -> Generator[datetime, None, None]:
-    if step is None:
-        step = timedelta(days=1)
+    start: datetime | date, end: datetime | date, step: timedelta | None = None
+) -> Generator[datetime | date, None, None]:
+    if step is None or step == _ONE_DAY:
+        if not isinstance(start, datetime):
+            for ordinal in range(start.toordinal(), end.toordinal() + 1):
+                yield date.fromordinal(ordinal)
+            return
+
+        start_time = start.timetz()
+        last = end.toordinal()
+        if start_time > end.timetz():
+            last -= 1
+        for ordinal in range(start.toordinal(), last + 1):
+            yield datetime.combine(date.fromordinal(ordinal), start_time)
+        return
 
     current = start
     while current <= end:
@@ -26,16 +40,19 @@ def iterate_datetime(
 
 
 def kill_all_processes(proc_name: str) -> None:
-    for proc in psutil.process_iter():
+    target = proc_name.lower()
+    for proc in psutil.process_iter(attrs=["name"]):
+        name = (proc.info["name"] or "").lower()
+        if not name.startswith(target):
+            continue
         try:
-            if proc_name in proc.name():
-                proc.terminate()
+            proc.terminate()
         except (psutil.AccessDenied, psutil.NoSuchProcess):
             continue
 
 
 def construct_screenshot_path(
-    screenshot_folder: Path,
+    screenshot_folder: str | Path,
     fullname: str,
     order_number: str,
     date: str,
@@ -43,7 +60,7 @@ def construct_screenshot_path(
 ) -> str:
     fullname = fullname.replace(" ", "_")
     order_number = order_number.replace(" ", "")
-    screenshot_path = screenshot_folder / f"{fullname}_{order_number}_{date}"
+    screenshot_path = Path(screenshot_folder) / f"{fullname}_{order_number}_{date}"
     screenshot_path = screenshot_path.with_suffix(img_format)
     return screenshot_path.as_posix()
 
@@ -55,30 +72,60 @@ def df_construct_screenshot_path(
     screenshot_folder: str,
     img_format: str = ".jpeg",
 ) -> pd.Series:
-    df = pd.DataFrame()
-    df.loc[:, "employee_fullname"] = employee_fullname.str.replace(" ", "_")
-    df.loc[:, "order_number"] = order_number.str.replace(" ", "")
-    df.loc[:, "screenshot_name"] = (
-        df["employee_fullname"] + "_" + df["order_number"] + "_" + today + img_format
-    )
-    df.loc[:, "screenshot_path"] = screenshot_folder + os.sep + df["screenshot_name"]
-    return df["screenshot_path"]
+    fullname = employee_fullname.str.replace(" ", "_", regex=False)
+    number = order_number.str.replace(" ", "", regex=False)
+    screenshot_name = fullname.str.cat(number, sep="_")
+    return (screenshot_folder + os.sep) + screenshot_name + f"_{today}{img_format}"
+
+
+REPORT_COLUMNS = ("Дата", "Сотрудник", "Операция", "Номер приказа", "Статус")
+
+ReportKey = tuple[str, str, str, str]
+
+_REPORT_KEYS: dict[Path, set[ReportKey]] = {}
+
+
+def report_log_path(report_file_path: Path) -> Path:
+    return report_file_path.with_suffix(".csv")
+
+
+def report_cell(value: object) -> str:
+    # calamine returns numbers as floats; keep "123" as the old dtype=str read did
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
 
 
 def create_report(report_file_path: Path) -> None:
-    if report_file_path.exists():
+    log_path = report_log_path(report_file_path)
+    _REPORT_KEYS.pop(log_path, None)
+    if log_path.exists():
         return
 
-    df = pd.DataFrame(
-        {
-            "Дата": [],
-            "Сотрудник": [],
-            "Операция": [],
-            "Номер приказа": [],
-            "Статус": [],
-        }
-    )
-    df.to_excel(report_file_path, index=False)
+    rows: list[list] = []
+    if report_file_path.exists():
+        from python_calamine import CalamineWorkbook
+
+        sheet = CalamineWorkbook.from_path(str(report_file_path)).get_sheet_by_index(0)
+        rows = sheet.to_python(skip_empty_area=True)[1:]
+
+    with open(log_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        writer.writerows([report_cell(value) for value in row] for row in rows)
+
+    if not report_file_path.exists():
+        finalize_report(report_file_path)
+
+
+def report_keys(log_path: Path) -> set[ReportKey]:
+    keys = _REPORT_KEYS.get(log_path)
+    if keys is None:
+        with open(log_path, "r", newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            keys = _REPORT_KEYS[log_path] = {tuple(row[:4]) for row in reader}
+    return keys
 
 
 def update_report(
@@ -87,38 +134,36 @@ def update_report(
     operation: str,
     status: str,
 ) -> None:
-    df = pd.read_excel(
-        job.registry.report_path,
-        dtype={
-            "Дата": str,
-            "Сотрудник": str,
-            "Операция": str,
-            "Номер приказа": str,
-            "Статус": str,
-        },
-        engine="calamine",
+    log_path = report_log_path(job.registry.report_path)
+    key = (
+        job.t_range.end.short,
+        order.employee_fullname,
+        operation,
+        order.order_number,
     )
 
-    match_filter = cast(
-        Series,
-        (
-            (df["Дата"] == job.t_range.end.short)
-            & (df["Сотрудник"] == order.employee_fullname)
-            & (df["Операция"] == operation)
-            & (df["Номер приказа"] == order.order_number)
-        ),
-    )
+    keys = report_keys(log_path)
+    if key in keys:
+        return
+
+    with open(log_path, "a", newline="", encoding="utf-8-sig") as f:
+        csv.writer(f).writerow((*key, status))
+    keys.add(key)
 
-    if not match_filter.any():
-        new_row = {
-            "Дата": job.t_range.end.short,
-            "Сотрудник": order.employee_fullname,
-            "Операция": operation,
-            "Номер приказа": order.order_number,
-            "Статус": status,
-        }
-        df.loc[len(df)] = new_row
-        df.to_excel(job.registry.report_path, index=False)
+
+def finalize_report(report_file_path: Path) -> None:
+    log_path = report_log_path(report_file_path)
+    if not log_path.exists():
+        return
+
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    with open(log_path, "r", newline="", encoding="utf-8-sig") as f:
+        for row in csv.reader(f):
+            ws.append(row)
+    wb.save(report_file_path)
 
 
 def generate_password(
@@ -128,8 +173,22 @@ def generate_password(
     min_up_letters: int = 1,
     min_punctuations: int = 1,
 ) -> str:
+    # One token_bytes call feeds the picks and the shuffle, not a syscall per char
+    pool = memoryview(b"")
+
+    def random_below(n: int) -> int:
+        nonlocal pool
+        limit = 65536 - 65536 % n
+        while True:
+            if len(pool) < 2:
+                pool = memoryview(secrets.token_bytes(4 * max(length, 16)))
+            value = int.from_bytes(pool[:2], "little")
+            pool = pool[2:]
+            if value < limit:
+                return value % n
+
     def random_chars(char_set: str, min_count: int) -> str:
-        return "".join(secrets.choice(char_set) for _ in range(min_count))
+        return "".join(char_set[random_below(len(char_set))] for _ in range(min_count))
 
     digits = random_chars(string.digits, min_digits)
     low_letters = random_chars(string.ascii_lowercase, min_low_letters)
@@ -144,7 +203,9 @@ def generate_password(
     password_chars = list(
         digits + low_letters + up_letters + punctuations + remaining_chars
     )
-    secrets.SystemRandom().shuffle(password_chars)
+    for i in range(len(password_chars) - 1, 0, -1):
+        j = random_below(i + 1)
+        password_chars[i], password_chars[j] = password_chars[j], password_chars[i]
 
     password = "".join(password_chars)
     return password